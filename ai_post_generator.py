@@ -30,37 +30,152 @@ AI 貼文生成器 - 使用 LangGraph 生成高轉化率的 Facebook 貼文和
 @requires langchain>=0.2.0
 @requires langgraph>=0.2.0
 @requires openai>=1.0.0
-@requires pillow>=10.0.0
+@requires httpx>=0.25.0
+@requires aiohttp>=3.9.0
+@requires aiofiles>=23.2.1
+@requires tenacity>=8.2.0
+@requires orjson>=3.9.0
+@requires numpy>=1.24.0
 """
 
-import os
-import json
-import base64
+import hashlib
+import functools
 import asyncio
+import operator
+import queue
+import re
+import threading
+import time
+import uuid
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Annotated, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Any
 from pathlib import Path
-from io import BytesIO
 
 import streamlit as st
-from PIL import Image
-import requests
+import aiofiles
+import aiofiles.os
+import aiohttp
+import httpx
+import orjson
+import openai
+import anthropic
+import numpy as np
 from pydantic import BaseModel, Field
+from tenacity import (
+    retry,
+    retry_if_exception,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_random_exponential
+)
 
 # LangChain 和 LangGraph 相關導入
 from langchain.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
-from langchain_openai import ChatOpenAI
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_anthropic import ChatAnthropic
-from langchain.schema import BaseMessage, AIMessage, HumanMessage, SystemMessage
+from langchain.schema import BaseMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
 from typing import TypedDict
 
 # 配置文件路徑
 AI_CONFIG_FILE = Path("data/ai_config.json")
 GENERATED_IMAGES_DIR = Path("data/generated_images")
+LLM_CACHE_DIR = Path("data/llm_cache")
+SEMANTIC_CACHE_FILE = Path("data/semantic_cache.jsonl")
+
+# LLM 回應快取的保存期限（秒）與檔案數上限
+LLM_CACHE_MAX_AGE = 7 * 24 * 60 * 60
+LLM_CACHE_MAX_FILES = 1000
+
+# 語意快取最多保留的項目數
+SEMANTIC_CACHE_MAX_ENTRIES = 500
+# 單一提示詞合併生成的主題數上限，超過後邊際效益遞減
+MAX_BATCH_TOPICS = 8
+# 批次生成時每篇貼文預留的輸出 token：每個字約 2 個 token，另加標題、標籤與 JSON 結構
+BATCH_TOKENS_PER_CHAR = 2
+BATCH_TOKENS_PER_POST_OVERHEAD = 200
+# 單次批次呼叫的輸出 token 上限，超過時縮小每批的主題數
+MAX_BATCH_OUTPUT_TOKENS = 4096
+# 批次回應的主題前可能照抄的列表編號
+_LIST_MARKER_RE = re.compile(r"^\d+\s*[.、)）:：]\s*")
 
 # 確保目錄存在
 GENERATED_IMAGES_DIR.mkdir(parents=True, exist_ok=True)
+LLM_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+# 背景事件迴圈：所有非同步 LLM 呼叫都在同一個迴圈上執行，
+# 讓 AsyncOpenAI / aiohttp 等非同步用戶端能跨多次生成重複使用
+_event_loop: Optional[asyncio.AbstractEventLoop] = None
+_event_loop_lock = threading.Lock()
+
+def _get_event_loop() -> asyncio.AbstractEventLoop:
+    """取得背景事件迴圈，首次呼叫時啟動"""
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_event_loop.run_forever,
+                name="ai-post-event-loop",
+                daemon=True
+            ).start()
+    return _event_loop
+
+def _run_async(coro):
+    """在背景事件迴圈上執行協程並等待結果（供 Streamlit 等同步呼叫端使用）"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_event_loop()).result()
+
+# 圖像下載共用的 HTTP 連線池，只在背景事件迴圈上建立和使用
+_http_session: Optional[aiohttp.ClientSession] = None
+
+def _get_http_session() -> aiohttp.ClientSession:
+    """取得共用的 aiohttp 連線池，重複下載時沿用既有的 TCP/TLS 連線"""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=20))
+    return _http_session
+
+# 所有工作流程共用的 API 併發上限，避免平行分支與多位使用者同時觸發速率限制
+_llm_semaphore: Optional[asyncio.Semaphore] = None
+
+def _get_llm_semaphore() -> asyncio.Semaphore:
+    """取得 API 併發上限的號誌，上限由配置的 llm_model_max_async 決定"""
+    global _llm_semaphore
+    if _llm_semaphore is None:
+        limit = AIConfigManager.load_config().get("llm_model_max_async", 8)
+        _llm_semaphore = asyncio.Semaphore(int(limit))
+    return _llm_semaphore
+
+# 遇到速率限制時以隨機指數退避重試
+_retry_on_rate_limit = retry(
+    retry=retry_if_exception_type((openai.RateLimitError, anthropic.RateLimitError)),
+    wait=wait_random_exponential(multiplier=1, max=20),
+    stop=stop_after_attempt(5),
+    reraise=True
+)
+
+def _is_retryable_download_error(error: BaseException) -> bool:
+    """判斷圖像下載錯誤是否值得重試（速率限制、伺服器錯誤或連線問題）"""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+_retry_on_download_error = retry(
+    retry=retry_if_exception(_is_retryable_download_error),
+    wait=wait_random_exponential(multiplier=1, max=20),
+    stop=stop_after_attempt(5),
+    reraise=True
+)
+
+@_retry_on_download_error
+async def _download_image(url: str, filepath: Path):
+    """串流下載圖像至檔案，不在記憶體中保留整張圖片"""
+    async with _get_http_session().get(url) as response:
+        response.raise_for_status()
+        async with aiofiles.open(filepath, 'wb') as f:
+            async for chunk in response.content.iter_chunked(65536):
+                await f.write(chunk)
 
 class PostGenerationRequest(BaseModel):
     """貼文生成請求模型"""
@@ -73,17 +188,44 @@ class PostGenerationRequest(BaseModel):
     max_length: int = Field(default=300, description="最大字數")
     generate_image: bool = Field(default=False, description="是否生成配圖")
     image_style: str = Field(default="現代簡約", description="配圖風格")
+    cache_ok: bool = Field(default=False, description="溫度大於 0 時是否仍允許使用快取回應")
 
 class GeneratedPost(BaseModel):
     """生成的貼文模型"""
     title: str
     content: str
-    hashtags: List[str] = []
-    predicted_engagement: Dict[str, float] = {}
-    optimization_tips: List[str] = []
+    hashtags: List[str] = Field(default_factory=list)
+    predicted_engagement: Dict[str, float] = Field(default_factory=dict)
+    optimization_tips: List[str] = Field(default_factory=list)
     image_url: Optional[str] = None
     image_description: Optional[str] = None
-    generation_metadata: Dict[str, Any] = {}
+    generation_metadata: Dict[str, Any] = Field(default_factory=dict)
+
+class EngagementScores(BaseModel):
+    """互動預測得分（1-10 分）"""
+    likes: float = Field(..., description="按讚率")
+    comments: float = Field(..., description="留言率")
+    shares: float = Field(..., description="分享率")
+    clicks: float = Field(..., description="點擊率")
+    overall: float = Field(..., description="整體互動率")
+
+class PostAnalysis(BaseModel):
+    """貼文分析結構化輸出模型"""
+    hashtags: List[str] = Field(default_factory=list, description="5-10 個相關標籤，每個以 # 開頭")
+    engagement: EngagementScores = Field(..., description="互動預測得分")
+    tips: List[str] = Field(default_factory=list, description="3-5 個具體的優化建議")
+
+class BatchPostDraft(BaseModel):
+    """批次生成中單篇貼文的結構化輸出"""
+    index: int = Field(..., description="主題編號，與輸入列表中的編號相同")
+    topic: str = Field(..., description="貼文主題，須與輸入的主題文字相同，不含編號")
+    title: str = Field(..., description="貼文標題")
+    content: str = Field(..., description="貼文內容")
+    hashtags: List[str] = Field(default_factory=list, description="5-10 個相關標籤，每個以 # 開頭")
+
+class PostBatch(BaseModel):
+    """批次生成結構化輸出模型"""
+    posts: List[BatchPostDraft] = Field(..., description="每個主題一篇貼文")
 
 class AIPostState(TypedDict):
     """AI 貼文生成狀態"""
@@ -96,7 +238,33 @@ class AIPostState(TypedDict):
     image_prompt: Optional[str]
     image_url: Optional[str]
     image_description: Optional[str]
-    errors: List[str]
+    # 平行分支會同時回報錯誤，使用 operator.add 合併
+    errors: Annotated[List[str], operator.add]
+
+# 預設 AI 配置
+DEFAULT_AI_CONFIG: Dict[str, Any] = {
+    "openai_api_key": "",
+    "anthropic_api_key": "",
+    "default_model": "gpt-4o-mini",
+    "image_model": "dall-e-3",
+    "max_tokens": 1000,
+    "temperature": 0.7,
+    "enable_image_generation": True,
+    "enable_semantic_cache": False,
+    "similarity_threshold": 0.92,
+    "llm_model_max_async": 8
+}
+
+@functools.lru_cache(maxsize=1)
+def _load_config_cached(mtime_ns: int) -> Dict[str, Any]:
+    """讀取 AI 配置檔，以檔案修改時間作為快取鍵，檔案未變更時不重新解析"""
+    try:
+        with open(AI_CONFIG_FILE, 'rb') as f:
+            config = orjson.loads(f.read())
+            # 合併預設配置以確保所有必要的鍵都存在
+            return {**DEFAULT_AI_CONFIG, **config}
+    except Exception:
+        return dict(DEFAULT_AI_CONFIG)
 
 class AIConfigManager:
     """AI 配置管理器"""
@@ -104,469 +272,702 @@ class AIConfigManager:
     @staticmethod
     def load_config() -> Dict[str, Any]:
         """載入 AI 配置"""
-        default_config = {
-            "openai_api_key": "",
-            "anthropic_api_key": "",
-            "default_model": "gpt-4o-mini",
-            "image_model": "dall-e-3",
-            "max_tokens": 1000,
-            "temperature": 0.7,
-            "enable_image_generation": True
-        }
-
         if not AI_CONFIG_FILE.exists():
+            default_config = dict(DEFAULT_AI_CONFIG)
             AIConfigManager.save_config(default_config)
             return default_config
 
-        try:
-            with open(AI_CONFIG_FILE, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-                # 合併預設配置以確保所有必要的鍵都存在
-                return {**default_config, **config}
-        except Exception:
-            return default_config
+        # 回傳副本，避免呼叫端修改到快取中的配置
+        return dict(_load_config_cached(AI_CONFIG_FILE.stat().st_mtime_ns))
 
     @staticmethod
     def save_config(config: Dict[str, Any]):
         """保存 AI 配置"""
         try:
-            with open(AI_CONFIG_FILE, 'w', encoding='utf-8') as f:
-                json.dump(config, f, ensure_ascii=False, indent=2)
+            with open(AI_CONFIG_FILE, 'wb') as f:
+                f.write(orjson.dumps(config, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
         except Exception as e:
             st.error(f"保存 AI 配置失敗: {e}")
+        finally:
+            global _llm_semaphore
+            _load_config_cached.cache_clear()
+            # 下次呼叫時依新配置重建併發上限
+            _llm_semaphore = None
+
+def _init_llm(config: Dict[str, Any]):
+    """初始化語言模型"""
+    model_name = config.get("default_model", "gpt-4o-mini")
+
+    if model_name.startswith("gpt-"):
+        if not config.get("openai_api_key"):
+            raise ValueError("需要設置 OpenAI API Key")
+        return ChatOpenAI(
+            model=model_name,
+            api_key=config["openai_api_key"],
+            temperature=config.get("temperature", 0.7),
+            max_tokens=config.get("max_tokens", 1000),
+            # 保持連線以重複使用 TLS 連線，平行節點共用同一個連線池
+            http_async_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_keepalive_connections=20)
+            )
+        )
+    elif model_name.startswith("claude-"):
+        if not config.get("anthropic_api_key"):
+            raise ValueError("需要設置 Anthropic API Key")
+        return ChatAnthropic(
+            model=model_name,
+            api_key=config["anthropic_api_key"],
+            temperature=config.get("temperature", 0.7),
+            max_tokens=config.get("max_tokens", 1000)
+        )
+    else:
+        raise ValueError(f"不支援的模型: {model_name}")
+
+def _llm_cache_key(llm, messages: List[BaseMessage], schema: Optional[type] = None) -> str:
+    """以 (模型, 訊息, 溫度, 最大長度, 輸出結構) 計算快取鍵"""
+    payload = {
+        "model": getattr(llm, "model_name", None) or getattr(llm, "model", ""),
+        "messages": [{"type": m.type, "content": m.content} for m in messages],
+        "temperature": getattr(llm, "temperature", None),
+        "max_tokens": getattr(llm, "max_tokens", None),
+        "schema": schema.__name__ if schema else None
+    }
+    raw = orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(raw).hexdigest()
+
+def _with_prompt_caching(llm, messages: List[BaseMessage]) -> List[BaseMessage]:
+    """為 Claude 模型的系統訊息加上 cache_control，啟用 Anthropic 提示詞前綴快取
+
+    OpenAI 會自動快取相同的提示詞前綴，只需維持靜態內容在前即可，不做額外處理。
+    """
+    if not isinstance(llm, ChatAnthropic):
+        return messages
+
+    return [
+        SystemMessage(content=[{
+            "type": "text",
+            "text": message.content,
+            "cache_control": {"type": "ephemeral"}
+        }])
+        if isinstance(message, SystemMessage) and isinstance(message.content, str) else message
+        for message in messages
+    ]
+
+def _llm_cache_file(llm, messages: List[BaseMessage], cache_ok: bool = False,
+                    schema: Optional[type] = None) -> Optional[Path]:
+    """回傳此請求的快取檔案路徑
+
+    溫度大於 0 時輸出本身不具確定性，除非請求設定 cache_ok，否則回傳 None 表示不使用快取。
+    """
+    if (getattr(llm, "temperature", None) or 0) > 0 and not cache_ok:
+        return None
+    return LLM_CACHE_DIR / f"{_llm_cache_key(llm, messages, schema)}.json"
+
+async def _read_llm_cache(cache_file: Path) -> Optional[Any]:
+    """讀取快取的回應內容，檔案不存在、損毀或已過期時回傳 None"""
+    try:
+        stat = await aiofiles.os.stat(cache_file)
+        if time.time() - stat.st_mtime > LLM_CACHE_MAX_AGE:
+            return None
+        async with aiofiles.open(cache_file, 'rb') as f:
+            return orjson.loads(await f.read())["content"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+def _prune_llm_cache():
+    """刪除過期的快取檔案，數量仍超過上限時從最舊的開始刪除"""
+    try:
+        files = [(path.stat().st_mtime, path) for path in LLM_CACHE_DIR.glob("*.json")]
+    except OSError:
+        return
+
+    files.sort()
+    expired_before = time.time() - LLM_CACHE_MAX_AGE
+    excess = len(files) - LLM_CACHE_MAX_FILES
+    for i, (mtime, path) in enumerate(files):
+        if mtime >= expired_before and i >= excess:
+            break
+        path.unlink(missing_ok=True)
+
+# 每寫入這麼多個快取檔案清理一次快取目錄
+_LLM_CACHE_PRUNE_INTERVAL = 50
+_llm_cache_writes = 0
+
+async def _write_llm_cache(cache_file: Path, content: Any):
+    """寫入快取的回應內容，並定期清理快取目錄"""
+    global _llm_cache_writes
+    try:
+        async with aiofiles.open(cache_file, 'wb') as f:
+            await f.write(orjson.dumps({"content": content}))
+    except OSError:
+        return
+
+    # 程序啟動後的第一次寫入也會清理，處理先前累積的檔案
+    if _llm_cache_writes % _LLM_CACHE_PRUNE_INTERVAL == 0:
+        await asyncio.to_thread(_prune_llm_cache)
+    _llm_cache_writes += 1
+
+async def _invoke_llm(llm, messages: List[BaseMessage], schema: Optional[type] = None):
+    """呼叫 LLM 並回傳文字內容；指定 schema 時回傳該模型的實例"""
+    runnable = llm.with_structured_output(schema) if schema else llm
+
+    @_retry_on_rate_limit
+    async def invoke():
+        async with _get_llm_semaphore():
+            result = await runnable.ainvoke(_with_prompt_caching(llm, messages))
+        return result if schema else result.content
+
+    return await invoke()
+
+async def _cached_ainvoke(llm, messages: List[BaseMessage], cache_ok: bool = False,
+                          schema: Optional[type] = None):
+    """呼叫 LLM 並回傳文字內容，相同提示詞命中快取時不再發出請求
+
+    指定 schema（Pydantic 模型）時改用 with_structured_output，回傳該模型的實例。
+    溫度大於 0 時輸出本身不具確定性，除非請求設定 cache_ok，否則不使用快取。
+    """
+    cache_file = _llm_cache_file(llm, messages, cache_ok, schema)
+    if cache_file is None:
+        return await _invoke_llm(llm, messages, schema)
+
+    cached = await _read_llm_cache(cache_file)
+    if cached is not None:
+        return schema.model_validate(cached) if schema else cached
+
+    result = await _invoke_llm(llm, messages, schema)
+    await _write_llm_cache(cache_file, result.model_dump() if schema else result)
+    return result
+
+# 提示詞模板在模組載入時建立一次，各節點呼叫時只需填入欄位
+
+# 貼文標題提示詞
+_TITLE_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(
+        "你是一位專業的社群媒體內容創作專家，專門創作高轉化率的 Facebook 貼文標題。"
+        "請根據以下要求生成吸引人的標題。"
+    ),
+    HumanMessagePromptTemplate.from_template(
+        "請為文末的主題創作一個吸引人的 Facebook 貼文標題。\n\n"
+        "要求：\n"
+        "1. 標題要簡潔有力，能夠吸引點擊\n"
+        "2. 符合目標受眾的興趣和需求\n"
+        "3. 體現指定的語調風格\n"
+        "4. 字數控制在 50 字以內\n"
+        "5. 使用繁體中文\n\n"
+        "只回傳標題內容，不需要其他說明。\n\n"
+        "主題：{topic}\n"
+        "目標受眾：{target_audience}\n"
+        "貼文類型：{post_type}\n"
+        "語調風格：{tone}\n"
+        "是否使用表情符號：{include_emoji}"
+    )
+])
+
+# 貼文內容提示詞
+_CONTENT_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(
+        "你是一位專業的社群媒體內容創作專家，專門創作高轉化率的 Facebook 貼文。"
+        "你了解如何運用心理學原理、storytelling 技巧和社群媒體最佳實踐來創作吸引人的內容。"
+    ),
+    HumanMessagePromptTemplate.from_template(
+        "請為文末的主題創作一篇高轉化率的 Facebook 貼文內容。\n\n"
+        "請遵循以下原則：\n"
+        "1. 開頭要有吸引力，能夠立即抓住讀者注意力\n"
+        "2. 內容要有價值，對目標受眾有實際幫助\n"
+        "3. 使用適當的情感觸發點\n"
+        "4. 包含明確的行動呼籲 (CTA)\n"
+        "5. 結構清晰，易於閱讀\n"
+        "6. 符合指定的語調風格\n"
+        "7. 使用繁體中文\n"
+        "8. 如果適合，可以加入相關的故事或案例\n\n"
+        "只回傳貼文內容，不需要其他說明。\n\n"
+        "主題：{topic}\n"
+        "目標受眾：{target_audience}\n"
+        "貼文類型：{post_type}\n"
+        "語調風格：{tone}\n"
+        "最大字數：{max_length}\n"
+        "是否使用表情符號：{include_emoji}"
+    )
+])
+
+# 圖像提示詞生成提示詞
+_IMAGE_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(
+        "你是一位專業的 AI 圖像生成提示詞專家，專門為社群媒體貼文創作高質量的圖像生成提示詞。"
+    ),
+    HumanMessagePromptTemplate.from_template(
+        "請為文末的 Facebook 貼文創作一個詳細的圖像生成提示詞。\n\n"
+        "要求：\n"
+        "1. 提示詞要詳細且具體\n"
+        "2. 包含視覺風格、色彩、構圖等元素\n"
+        "3. 確保圖像與貼文內容高度相關\n"
+        "4. 考慮目標受眾的喜好\n"
+        "5. 使用英文撰寫提示詞\n"
+        "6. 避免包含文字內容\n\n"
+        "只回傳提示詞內容，不需要其他說明。\n\n"
+        "圖像風格：{image_style}\n"
+        "目標受眾：{target_audience}\n"
+        "貼文主題：{topic}\n"
+        "貼文內容：{content}"
+    )
+])
+
+# 貼文分析（標籤、互動預測、優化建議）提示詞
+_ANALYSIS_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(
+        "你是一位社群媒體分析專家，專門為 Facebook 貼文生成有效的標籤、"
+        "預測互動效果並提供提高貼文效果的建議。"
+    ),
+    HumanMessagePromptTemplate.from_template(
+        "請分析文末的 Facebook 貼文，並一次完成以下三項工作。\n\n"
+        "一、標籤 (hashtags)：生成 5-10 個相關的 Facebook 標籤\n"
+        "1. 標籤要與主題高度相關\n"
+        "2. 考慮目標受眾的搜尋習慣\n"
+        "3. 混合熱門和利基標籤\n"
+        "4. 使用繁體中文和英文\n"
+        "5. 每個標籤前加上 # 符號\n\n"
+        "二、互動預測 (engagement)：預測按讚、留言、分享、點擊與整體互動的得分（1-10分）\n\n"
+        "三、優化建議 (tips)：提供 3-5 個具體、可行的優化建議\n"
+        "每個建議為一句話，使用繁體中文，涵蓋內容、時機、互動等方面\n\n"
+        "主題：{topic}\n"
+        "目標受眾：{target_audience}\n"
+        "貼文類型：{post_type}\n"
+        "標題：{title}\n"
+        "內容：{content}"
+    )
+])
+
+# 批次生成提示詞：多個主題合併為一次呼叫
+_BATCH_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(
+        "你是一位專業的社群媒體內容創作專家，專門創作高轉化率的 Facebook 貼文。"
+        "你了解如何運用心理學原理、storytelling 技巧和社群媒體最佳實踐來創作吸引人的內容。"
+    ),
+    HumanMessagePromptTemplate.from_template(
+        "請為文末列出的每個主題各創作一篇高轉化率的 Facebook 貼文，"
+        "每篇包含主題編號、主題、標題、內容與標籤；"
+        "主題編號為下方列表中的數字，主題為編號之後的文字，不含編號。\n\n"
+        "請遵循以下原則：\n"
+        "1. 標題簡潔有力，字數控制在 50 字以內\n"
+        "2. 內容開頭要有吸引力，對目標受眾有實際幫助\n"
+        "3. 包含明確的行動呼籲 (CTA)\n"
+        "4. 符合指定的語調風格\n"
+        "5. 每篇生成 5-10 個相關標籤，每個標籤前加上 # 符號\n"
+        "6. 使用繁體中文\n"
+        "7. 各篇貼文內容彼此獨立，不要互相引用\n\n"
+        "目標受眾：{target_audience}\n"
+        "貼文類型：{post_type}\n"
+        "語調風格：{tone}\n"
+        "每篇最大字數：{max_length}\n"
+        "是否使用表情符號：{include_emoji}\n"
+        "主題（共 {count} 個）：\n{topics}"
+    )
+])
+
+class SemanticPromptCache:
+    """語意提示詞快取
+
+    以提示詞模板骨架與主題以外的欄位值計算比對鍵，只有鍵完全相同的請求才會互相比對；
+    同一鍵下再以主題的嵌入向量比對，餘弦相似度達到門檻時直接重用先前的回應。
+    快取項目以 JSONL 追加寫入，行數超過上限兩倍時才整理檔案。
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.threshold = float(config.get("similarity_threshold", 0.92))
+        self.embeddings = OpenAIEmbeddings(api_key=config["openai_api_key"])
+        self.keys: List[str] = []
+        self.responses: List[str] = []
+        # 已正規化的主題嵌入向量，每列對應一個快取項目
+        self.vectors: Optional[np.ndarray] = None
+        self._file_lines = 0
+        self._file_lock = threading.Lock()
+        self._load_entries()
+
+    def _load_entries(self):
+        """載入已保存的快取項目，只保留最新的 SEMANTIC_CACHE_MAX_ENTRIES 個"""
+        entries = []
+        try:
+            with open(SEMANTIC_CACHE_FILE, 'rb') as f:
+                for line in f:
+                    self._file_lines += 1
+                    try:
+                        entries.append(orjson.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
+            return
+
+        entries = entries[-SEMANTIC_CACHE_MAX_ENTRIES:]
+        if entries:
+            self.keys = [entry["key"] for entry in entries]
+            self.responses = [entry["response"] for entry in entries]
+            self.vectors = np.array([entry["embedding"] for entry in entries], dtype=np.float32)
+
+    def _append_entry(self, entry: Dict[str, Any],
+                      snapshot: Tuple[List[str], List[str], np.ndarray]):
+        """追加一個快取項目至檔案，行數過多時改以快照中的項目重寫檔案
+
+        在背景執行緒中執行，快照由呼叫端在事件迴圈上建立，避免與後續的 store 互相干擾。
+        """
+        keys, responses, vectors = snapshot
+        with self._file_lock:
+            try:
+                if self._file_lines >= 2 * SEMANTIC_CACHE_MAX_ENTRIES:
+                    tmp_file = SEMANTIC_CACHE_FILE.with_suffix(".tmp")
+                    with open(tmp_file, 'wb') as f:
+                        for key, response, vector in zip(keys, responses, vectors):
+                            f.write(orjson.dumps({
+                                "key": key,
+                                "embedding": vector,
+                                "response": response
+                            }, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE))
+                    tmp_file.replace(SEMANTIC_CACHE_FILE)
+                    self._file_lines = len(keys)
+                else:
+                    with open(SEMANTIC_CACHE_FILE, 'ab') as f:
+                        f.write(orjson.dumps(
+                            entry, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE
+                        ))
+                    self._file_lines += 1
+            except OSError:
+                pass
+
+    @staticmethod
+    def match_key(prompt: ChatPromptTemplate, slots: Dict[str, Any]) -> str:
+        """以提示詞模板骨架（未填入欄位值）和主題以外的欄位值計算比對鍵"""
+        skeleton = "\n".join(message.prompt.template for message in prompt.messages)
+        other_slots = {key: value for key, value in slots.items() if key != "topic"}
+        raw = orjson.dumps({"skeleton": skeleton, "slots": other_slots}, option=orjson.OPT_SORT_KEYS)
+        return hashlib.sha256(raw).hexdigest()
+
+    @_retry_on_rate_limit
+    async def _embed(self, text: str) -> np.ndarray:
+        """計算文字的正規化嵌入向量"""
+        async with _get_llm_semaphore():
+            embedding = await self.embeddings.aembed_query(text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def lookup(self, key: str, topic: str) -> Tuple[Optional[str], np.ndarray]:
+        """查詢相同比對鍵下主題相近的回應，回傳 (命中的回應或 None, 本次主題的嵌入向量)"""
+        vector = await self._embed(topic)
+        if self.vectors is None:
+            return None, vector
+
+        candidates = [i for i, entry_key in enumerate(self.keys) if entry_key == key]
+        if not candidates:
+            return None, vector
+
+        scores = self.vectors[candidates] @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None, vector
+        return self.responses[candidates[best]], vector
+
+    async def store(self, key: str, vector: np.ndarray, response: str):
+        """新增快取項目，超過上限時捨棄最舊的項目"""
+        self.keys.append(key)
+        self.responses.append(response)
+        self.vectors = vector[np.newaxis] if self.vectors is None else np.vstack([self.vectors, vector])
+
+        if len(self.keys) > SEMANTIC_CACHE_MAX_ENTRIES:
+            del self.keys[:-SEMANTIC_CACHE_MAX_ENTRIES]
+            del self.responses[:-SEMANTIC_CACHE_MAX_ENTRIES]
+            self.vectors = self.vectors[-SEMANTIC_CACHE_MAX_ENTRIES:]
+
+        await asyncio.to_thread(self._append_entry, {
+            "key": key,
+            "embedding": vector,
+            "response": response
+        }, (list(self.keys), list(self.responses), self.vectors))
 
 class PostContentGenerator:
     """貼文內容生成器"""
 
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], llm):
         self.config = config
-        self.llm = self._init_llm()
-
-    def _init_llm(self):
-        """初始化語言模型"""
-        model_name = self.config.get("default_model", "gpt-4o-mini")
-
-        if model_name.startswith("gpt-"):
-            if not self.config.get("openai_api_key"):
-                raise ValueError("需要設置 OpenAI API Key")
-            return ChatOpenAI(
-                model=model_name,
-                api_key=self.config["openai_api_key"],
-                temperature=self.config.get("temperature", 0.7),
-                max_tokens=self.config.get("max_tokens", 1000)
-            )
-        elif model_name.startswith("claude-"):
-            if not self.config.get("anthropic_api_key"):
-                raise ValueError("需要設置 Anthropic API Key")
-            return ChatAnthropic(
-                model=model_name,
-                api_key=self.config["anthropic_api_key"],
-                temperature=self.config.get("temperature", 0.7),
-                max_tokens=self.config.get("max_tokens", 1000)
-            )
-        else:
-            raise ValueError(f"不支援的模型: {model_name}")
-
-    def generate_title(self, state: AIPostState) -> AIPostState:
-        """生成貼文標題"""
+        self.llm = llm
+        self.semantic_cache = None
+        if config.get("enable_semantic_cache") and config.get("openai_api_key"):
+            self.semantic_cache = SemanticPromptCache(config)
+
+    async def _ainvoke_prompt(self, prompt: ChatPromptTemplate, slots: Dict[str, Any],
+                              request: PostGenerationRequest) -> str:
+        """
+        格式化提示詞並呼叫 LLM，啟用語意快取時先比對主題相近的請求
+
+        語意快取與精確比對快取採相同條件：溫度大於 0 且未設定 cache_ok 時不使用，
+        讓多版本生成與重新生成能得到不同的結果。
+        """
+        formatted_prompt = prompt.format_messages(**slots)
+        cache_file = _llm_cache_file(self.llm, formatted_prompt, cache_ok=request.cache_ok)
+
+        if self.semantic_cache is None or cache_file is None:
+            return await _cached_ainvoke(self.llm, formatted_prompt, cache_ok=request.cache_ok)
+
+        # 先查精確比對快取，命中時不必呼叫嵌入 API
+        cached = await _read_llm_cache(cache_file)
+        if cached is not None:
+            return cached
+
+        key = SemanticPromptCache.match_key(prompt, slots)
         try:
-            request = state["request"]
-
-            prompt = ChatPromptTemplate.from_messages([
-                SystemMessagePromptTemplate.from_template(
-                    "你是一位專業的社群媒體內容創作專家，專門創作高轉化率的 Facebook 貼文標題。"
-                    "請根據以下要求生成吸引人的標題。"
-                ),
-                HumanMessagePromptTemplate.from_template(
-                    "請為以下主題創作一個吸引人的 Facebook 貼文標題：\n\n"
-                    "主題：{topic}\n"
-                    "目標受眾：{target_audience}\n"
-                    "貼文類型：{post_type}\n"
-                    "語調風格：{tone}\n"
-                    "是否使用表情符號：{include_emoji}\n\n"
-                    "要求：\n"
-                    "1. 標題要簡潔有力，能夠吸引點擊\n"
-                    "2. 符合目標受眾的興趣和需求\n"
-                    "3. 體現指定的語調風格\n"
-                    "4. 字數控制在 50 字以內\n"
-                    "5. 使用繁體中文\n\n"
-                    "只回傳標題內容，不需要其他說明。"
-                )
-            ])
-
-            formatted_prompt = prompt.format_messages(
-                topic=request.topic,
-                target_audience=request.target_audience,
-                post_type=request.post_type,
-                tone=request.tone,
-                include_emoji="是" if request.include_emoji else "否"
-            )
+            cached_response, vector = await self.semantic_cache.lookup(key, slots["topic"])
+        except Exception:
+            cached_response, vector = None, None
 
-            response = self.llm.invoke(formatted_prompt)
-            state["generated_title"] = response.content.strip()
+        if cached_response is not None:
+            return cached_response
 
-        except Exception as e:
-            state["errors"].append(f"標題生成失敗: {str(e)}")
-            state["generated_title"] = f"關於{state['request'].topic}的精彩內容"
+        content = await _invoke_llm(self.llm, formatted_prompt)
+        await _write_llm_cache(cache_file, content)
+        if vector is not None:
+            await self.semantic_cache.store(key, vector, content)
+        return content
 
-        return state
-
-    def generate_content(self, state: AIPostState) -> AIPostState:
-        """生成貼文內容"""
+    async def generate_title(self, state: AIPostState) -> Dict[str, Any]:
+        """生成貼文標題"""
         try:
             request = state["request"]
 
-            prompt = ChatPromptTemplate.from_messages([
-                SystemMessagePromptTemplate.from_template(
-                    "你是一位專業的社群媒體內容創作專家，專門創作高轉化率的 Facebook 貼文。"
-                    "你了解如何運用心理學原理、storytelling 技巧和社群媒體最佳實踐來創作吸引人的內容。"
-                ),
-                HumanMessagePromptTemplate.from_template(
-                    "請為以下主題創作一篇高轉化率的 Facebook 貼文內容：\n\n"
-                    "主題：{topic}\n"
-                    "目標受眾：{target_audience}\n"
-                    "貼文類型：{post_type}\n"
-                    "語調風格：{tone}\n"
-                    "最大字數：{max_length}\n"
-                    "是否使用表情符號：{include_emoji}\n\n"
-                    "請遵循以下原則：\n"
-                    "1. 開頭要有吸引力，能夠立即抓住讀者注意力\n"
-                    "2. 內容要有價值，對目標受眾有實際幫助\n"
-                    "3. 使用適當的情感觸發點\n"
-                    "4. 包含明確的行動呼籲 (CTA)\n"
-                    "5. 結構清晰，易於閱讀\n"
-                    "6. 符合指定的語調風格\n"
-                    "7. 使用繁體中文\n"
-                    "8. 如果適合，可以加入相關的故事或案例\n\n"
-                    "只回傳貼文內容，不需要其他說明。"
-                )
-            ])
-
-            formatted_prompt = prompt.format_messages(
-                topic=request.topic,
-                target_audience=request.target_audience,
-                post_type=request.post_type,
-                tone=request.tone,
-                max_length=request.max_length,
-                include_emoji="是" if request.include_emoji else "否"
-            )
-
-            response = self.llm.invoke(formatted_prompt)
-            state["generated_content"] = response.content.strip()
+            content = await self._ainvoke_prompt(_TITLE_PROMPT, {
+                "topic": request.topic,
+                "target_audience": request.target_audience,
+                "post_type": request.post_type,
+                "tone": request.tone,
+                "include_emoji": "是" if request.include_emoji else "否"
+            }, request)
+            return {"generated_title": content.strip()}
 
         except Exception as e:
-            state["errors"].append(f"內容生成失敗: {str(e)}")
-            state["generated_content"] = f"分享關於{state['request'].topic}的精彩內容..."
-
-        return state
+            return {
+                "generated_title": f"關於{state['request'].topic}的精彩內容",
+                "errors": [f"標題生成失敗: {str(e)}"]
+            }
 
-    def generate_hashtags(self, state: AIPostState) -> AIPostState:
-        """生成相關標籤"""
+    async def generate_content(self, state: AIPostState) -> Dict[str, Any]:
+        """生成貼文內容"""
         try:
-            if not state["request"].include_hashtags:
-                state["hashtags"] = []
-                return state
-
             request = state["request"]
 
-            prompt = ChatPromptTemplate.from_messages([
-                SystemMessagePromptTemplate.from_template(
-                    "你是一位社群媒體標籤專家，專門為 Facebook 貼文生成有效的標籤。"
-                ),
-                HumanMessagePromptTemplate.from_template(
-                    "請為以下主題生成 5-10 個相關的 Facebook 標籤：\n\n"
-                    "主題：{topic}\n"
-                    "目標受眾：{target_audience}\n"
-                    "貼文類型：{post_type}\n\n"
-                    "要求：\n"
-                    "1. 標籤要與主題高度相關\n"
-                    "2. 考慮目標受眾的搜尋習慣\n"
-                    "3. 混合熱門和利基標籤\n"
-                    "4. 使用繁體中文和英文\n"
-                    "5. 每個標籤前加上 # 符號\n\n"
-                    "請以逗號分隔的格式回傳標籤，例如：#標籤1, #標籤2, #標籤3"
-                )
-            ])
-
-            formatted_prompt = prompt.format_messages(
-                topic=request.topic,
-                target_audience=request.target_audience,
-                post_type=request.post_type
-            )
-
-            response = self.llm.invoke(formatted_prompt)
-            hashtags_text = response.content.strip()
-
-            # 解析標籤
-            hashtags = [tag.strip() for tag in hashtags_text.split(',')]
-            # 確保每個標籤都有 # 符號
-            hashtags = [tag if tag.startswith('#') else f'#{tag}' for tag in hashtags]
-            state["hashtags"] = hashtags
+            content = await self._ainvoke_prompt(_CONTENT_PROMPT, {
+                "topic": request.topic,
+                "target_audience": request.target_audience,
+                "post_type": request.post_type,
+                "tone": request.tone,
+                "max_length": request.max_length,
+                "include_emoji": "是" if request.include_emoji else "否"
+            }, request)
+            return {"generated_content": content.strip()}
 
         except Exception as e:
-            state["errors"].append(f"標籤生成失敗: {str(e)}")
-            state["hashtags"] = [f"#{state['request'].topic}"]
-
-        return state
+            return {
+                "generated_content": f"分享關於{state['request'].topic}的精彩內容...",
+                "errors": [f"內容生成失敗: {str(e)}"]
+            }
 
 class ImageGenerator:
     """AI 圖像生成器"""
 
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], llm):
         self.config = config
+        self.llm = llm
         self.openai_client = None
         if config.get("openai_api_key"):
-            import openai
-            self.openai_client = openai.OpenAI(api_key=config["openai_api_key"])
+            self.openai_client = openai.AsyncOpenAI(api_key=config["openai_api_key"])
+
+    @_retry_on_rate_limit
+    async def _create_image(self, prompt: str) -> str:
+        """呼叫圖像生成 API 並回傳圖像網址"""
+        async with _get_llm_semaphore():
+            response = await self.openai_client.images.generate(
+                model=self.config.get("image_model", "dall-e-3"),
+                prompt=prompt,
+                size="1024x1024",
+                quality="standard",
+                n=1,
+            )
+        return response.data[0].url
 
-    def generate_image_prompt(self, state: AIPostState) -> AIPostState:
+    async def generate_image_prompt(self, state: AIPostState) -> Dict[str, Any]:
         """生成圖像提示詞"""
         try:
-            if not state["request"].generate_image:
-                return state
-
             request = state["request"]
 
             # 使用 LLM 生成圖像提示詞
-            llm = PostContentGenerator(self.config).llm
-
-            prompt = ChatPromptTemplate.from_messages([
-                SystemMessagePromptTemplate.from_template(
-                    "你是一位專業的 AI 圖像生成提示詞專家，專門為社群媒體貼文創作高質量的圖像生成提示詞。"
-                ),
-                HumanMessagePromptTemplate.from_template(
-                    "請為以下 Facebook 貼文創作一個詳細的圖像生成提示詞：\n\n"
-                    "貼文主題：{topic}\n"
-                    "貼文內容：{content}\n"
-                    "目標受眾：{target_audience}\n"
-                    "圖像風格：{image_style}\n\n"
-                    "要求：\n"
-                    "1. 提示詞要詳細且具體\n"
-                    "2. 包含視覺風格、色彩、構圖等元素\n"
-                    "3. 確保圖像與貼文內容高度相關\n"
-                    "4. 考慮目標受眾的喜好\n"
-                    "5. 使用英文撰寫提示詞\n"
-                    "6. 避免包含文字內容\n\n"
-                    "只回傳提示詞內容，不需要其他說明。"
-                )
-            ])
-
-            formatted_prompt = prompt.format_messages(
+            formatted_prompt = _IMAGE_PROMPT.format_messages(
                 topic=request.topic,
                 content=state.get("generated_content", ""),
                 target_audience=request.target_audience,
                 image_style=request.image_style
             )
 
-            response = llm.invoke(formatted_prompt)
-            state["image_prompt"] = response.content.strip()
+            content = await _cached_ainvoke(self.llm, formatted_prompt, cache_ok=request.cache_ok)
+            return {"image_prompt": content.strip()}
 
         except Exception as e:
-            state["errors"].append(f"圖像提示詞生成失敗: {str(e)}")
-            state["image_prompt"] = f"Beautiful {state['request'].topic} illustration"
-
-        return state
+            return {
+                "image_prompt": f"Beautiful {state['request'].topic} illustration",
+                "errors": [f"圖像提示詞生成失敗: {str(e)}"]
+            }
 
-    def generate_image(self, state: AIPostState) -> AIPostState:
+    async def generate_image(self, state: AIPostState) -> Dict[str, Any]:
         """生成圖像"""
         try:
-            if not state["request"].generate_image or not state.get("image_prompt"):
-                return state
+            if not state.get("image_prompt"):
+                return {}
 
             if not self.openai_client:
-                state["errors"].append("圖像生成需要 OpenAI API Key")
-                return state
+                return {"errors": ["圖像生成需要 OpenAI API Key"]}
 
             # 使用 DALL-E 3 生成圖像
-            response = self.openai_client.images.generate(
-                model=self.config.get("image_model", "dall-e-3"),
-                prompt=state["image_prompt"],
-                size="1024x1024",
-                quality="standard",
-                n=1,
-            )
+            image_url = await self._create_image(state["image_prompt"])
 
-            image_url = response.data[0].url
+            # 生成唯一的檔案名稱；多個版本並行生成時時間戳記可能相同，另加隨機後綴
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"generated_{timestamp}_{uuid.uuid4().hex[:8]}.png"
+            filepath = GENERATED_IMAGES_DIR / filename
 
             # 下載並保存圖像
-            image_response = requests.get(image_url)
-            if image_response.status_code == 200:
-                # 生成唯一的檔案名稱
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"generated_{timestamp}.png"
-                filepath = GENERATED_IMAGES_DIR / filename
-
-                with open(filepath, 'wb') as f:
-                    f.write(image_response.content)
+            try:
+                await _download_image(image_url, filepath)
+            except aiohttp.ClientError:
+                return {"errors": ["圖像下載失敗"]}
 
-                state["image_url"] = str(filepath)
-                state["image_description"] = state["image_prompt"]
-            else:
-                state["errors"].append("圖像下載失敗")
+            return {
+                "image_url": str(filepath),
+                "image_description": state["image_prompt"]
+            }
 
         except Exception as e:
-            state["errors"].append(f"圖像生成失敗: {str(e)}")
-
-        return state
+            return {"errors": [f"圖像生成失敗: {str(e)}"]}
 
 class EngagementPredictor:
-    """互動預測器"""
+    """貼文分析器：一次呼叫同時產生標籤、互動預測與優化建議"""
 
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], llm):
         self.config = config
-        self.llm = PostContentGenerator(config).llm
+        self.llm = llm
+
+    async def analyze_post(self, state: AIPostState) -> Dict[str, Any]:
+        """分析貼文，產生標籤、互動預測和優化建議"""
+        request = state["request"]
 
-    def predict_engagement(self, state: AIPostState) -> AIPostState:
-        """預測貼文互動效果"""
         try:
-            prompt = ChatPromptTemplate.from_messages([
-                SystemMessagePromptTemplate.from_template(
-                    "你是一位社群媒體數據分析專家，專門預測 Facebook 貼文的互動效果。"
-                ),
-                HumanMessagePromptTemplate.from_template(
-                    "請分析以下 Facebook 貼文的預期互動效果：\n\n"
-                    "標題：{title}\n"
-                    "內容：{content}\n"
-                    "標籤：{hashtags}\n"
-                    "目標受眾：{target_audience}\n"
-                    "貼文類型：{post_type}\n\n"
-                    "請預測以下指標的得分（1-10分）：\n"
-                    "1. 按讚率\n"
-                    "2. 留言率\n"
-                    "3. 分享率\n"
-                    "4. 點擊率\n"
-                    "5. 整體互動率\n\n"
-                    "請以 JSON 格式回傳結果，例如：\n"
-                    "{{\n"
-                    "  \"likes\": 7.5,\n"
-                    "  \"comments\": 6.0,\n"
-                    "  \"shares\": 5.5,\n"
-                    "  \"clicks\": 8.0,\n"
-                    "  \"overall\": 7.0\n"
-                    "}}"
-                )
-            ])
-
-            formatted_prompt = prompt.format_messages(
+            formatted_prompt = _ANALYSIS_PROMPT.format_messages(
+                topic=request.topic,
+                target_audience=request.target_audience,
+                post_type=request.post_type,
                 title=state.get("generated_title", ""),
-                content=state.get("generated_content", ""),
-                hashtags=", ".join(state.get("hashtags", [])),
-                target_audience=state["request"].target_audience,
-                post_type=state["request"].post_type
+                content=state.get("generated_content", "")
             )
 
-            response = self.llm.invoke(formatted_prompt)
-
-            # 解析 JSON 回應
-            try:
-                engagement_data = json.loads(response.content.strip())
-                state["engagement_prediction"] = engagement_data
-            except json.JSONDecodeError:
-                # 如果無法解析 JSON，使用預設值
-                state["engagement_prediction"] = {
-                    "likes": 6.0,
-                    "comments": 5.0,
-                    "shares": 4.5,
-                    "clicks": 6.5,
-                    "overall": 5.5
-                }
-
-        except Exception as e:
-            state["errors"].append(f"互動預測失敗: {str(e)}")
-            state["engagement_prediction"] = {
-                "likes": 5.0,
-                "comments": 5.0,
-                "shares": 5.0,
-                "clicks": 5.0,
-                "overall": 5.0
-            }
-
-        return state
-
-    def generate_optimization_tips(self, state: AIPostState) -> AIPostState:
-        """生成優化建議"""
-        try:
-            prompt = ChatPromptTemplate.from_messages([
-                SystemMessagePromptTemplate.from_template(
-                    "你是一位社群媒體優化專家，專門提供提高 Facebook 貼文效果的建議。"
-                ),
-                HumanMessagePromptTemplate.from_template(
-                    "請分析以下 Facebook 貼文並提供 3-5 個具體的優化建議：\n\n"
-                    "標題：{title}\n"
-                    "內容：{content}\n"
-                    "標籤：{hashtags}\n"
-                    "預測互動分數：{engagement_scores}\n\n"
-                    "請提供具體、可行的優化建議，每個建議用一行表示，使用繁體中文。\n"
-                    "建議應該涵蓋內容、時機、互動等方面。"
-                )
-            ])
-
-            formatted_prompt = prompt.format_messages(
-                title=state.get("generated_title", ""),
-                content=state.get("generated_content", ""),
-                hashtags=", ".join(state.get("hashtags", [])),
-                engagement_scores=str(state.get("engagement_prediction", {}))
+            analysis = await _cached_ainvoke(
+                self.llm, formatted_prompt, cache_ok=request.cache_ok, schema=PostAnalysis
             )
 
-            response = self.llm.invoke(formatted_prompt)
+            hashtags = []
+            if request.include_hashtags:
+                # 確保每個標籤都有 # 符號
+                hashtags = [tag.strip() for tag in analysis.hashtags if tag.strip()]
+                hashtags = [tag if tag.startswith('#') else f'#{tag}' for tag in hashtags]
 
-            # 將回應分割為建議列表
-            tips = [tip.strip() for tip in response.content.strip().split('\n') if tip.strip()]
             # 移除編號
+            tips = [tip.strip() for tip in analysis.tips if tip.strip()]
             tips = [tip.replace(f"{i+1}.", "").replace(f"{i+1}、", "").strip()
                    for i, tip in enumerate(tips)]
 
-            state["optimization_tips"] = tips[:5]  # 最多 5 個建議
+            return {
+                "hashtags": hashtags,
+                "engagement_prediction": analysis.engagement.model_dump(),
+                "optimization_tips": tips[:5]  # 最多 5 個建議
+            }
 
         except Exception as e:
-            state["errors"].append(f"優化建議生成失敗: {str(e)}")
-            state["optimization_tips"] = [
-                "考慮在貼文中加入更多互動元素",
-                "嘗試在最佳時間發布貼文",
-                "使用更吸引人的視覺內容"
-            ]
-
-        return state
+            return {
+                "hashtags": [f"#{request.topic}"] if request.include_hashtags else [],
+                "engagement_prediction": {
+                    "likes": 5.0,
+                    "comments": 5.0,
+                    "shares": 5.0,
+                    "clicks": 5.0,
+                    "overall": 5.0
+                },
+                "optimization_tips": [
+                    "考慮在貼文中加入更多互動元素",
+                    "嘗試在最佳時間發布貼文",
+                    "使用更吸引人的視覺內容"
+                ],
+                "errors": [f"貼文分析失敗: {str(e)}"]
+            }
 
 class AIPostWorkflow:
     """AI 貼文生成工作流程"""
 
     def __init__(self):
         self.config = AIConfigManager.load_config()
-        self.content_generator = PostContentGenerator(self.config)
-        self.image_generator = ImageGenerator(self.config)
-        self.engagement_predictor = EngagementPredictor(self.config)
+        # 所有生成器共用同一個 LLM 用戶端與連線池
+        self.llm = _init_llm(self.config)
+        self.content_generator = PostContentGenerator(self.config, self.llm)
+        self.image_generator = ImageGenerator(self.config, self.llm)
+        self.engagement_predictor = EngagementPredictor(self.config, self.llm)
+        # 工作流程圖為靜態結構，整個程序只編譯一次；節點經由執行配置取得本實例
         self.workflow = self._build_workflow()
+        self.run_config: RunnableConfig = {"configurable": {"workflow": self}}
 
-    def _build_workflow(self) -> StateGraph:
-        """構建 LangGraph 工作流程"""
+    @staticmethod
+    def _route_after_content(state: AIPostState) -> List[str]:
+        """決定內容生成後要平行執行的分支"""
+        if state["request"].generate_image:
+            return ["analyze_post", "generate_image_prompt"]
+        return ["analyze_post"]
+
+    @staticmethod
+    def _node(generator: str, method: str):
+        """建立工作流程節點，執行時由 config["configurable"]["workflow"] 取得生成器"""
+        async def node(state: AIPostState, config: RunnableConfig) -> Dict[str, Any]:
+            workflow = config["configurable"]["workflow"]
+            return await getattr(getattr(workflow, generator), method)(state)
+
+        return node
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1)
+    def _build_workflow() -> StateGraph:
+        """構建並編譯 LangGraph 工作流程（每個程序僅執行一次）"""
+        node = AIPostWorkflow._node
         workflow = StateGraph(AIPostState)
 
         # 添加節點
-        workflow.add_node("generate_title", self.content_generator.generate_title)
-        workflow.add_node("generate_content", self.content_generator.generate_content)
-        workflow.add_node("generate_hashtags", self.content_generator.generate_hashtags)
-        workflow.add_node("generate_image_prompt", self.image_generator.generate_image_prompt)
-        workflow.add_node("generate_image", self.image_generator.generate_image)
-        workflow.add_node("predict_engagement", self.engagement_predictor.predict_engagement)
-        workflow.add_node("generate_tips", self.engagement_predictor.generate_optimization_tips)
-
-        # 設置工作流程
+        workflow.add_node("generate_title", node("content_generator", "generate_title"))
+        workflow.add_node("generate_content", node("content_generator", "generate_content"))
+        workflow.add_node("generate_image_prompt", node("image_generator", "generate_image_prompt"))
+        workflow.add_node("generate_image", node("image_generator", "generate_image"))
+        workflow.add_node("analyze_post", node("engagement_predictor", "analyze_post"))
+
+        # 設置工作流程：標題 → 內容，之後分岔為兩條平行分支
+        # {貼文分析（標籤、互動預測、優化建議）‖ 圖像提示詞 → 圖像}
         workflow.set_entry_point("generate_title")
         workflow.add_edge("generate_title", "generate_content")
-        workflow.add_edge("generate_content", "generate_hashtags")
-        workflow.add_edge("generate_hashtags", "generate_image_prompt")
+        # 未要求配圖時不進入圖像分支，省去兩次節點調度
+        workflow.add_conditional_edges(
+            "generate_content",
+            AIPostWorkflow._route_after_content,
+            ["analyze_post", "generate_image_prompt"]
+        )
         workflow.add_edge("generate_image_prompt", "generate_image")
-        workflow.add_edge("generate_image", "predict_engagement")
-        workflow.add_edge("predict_engagement", "generate_tips")
-        workflow.add_edge("generate_tips", END)
+
+        # 各分支匯流至 END，所有分支完成後才結束
+        workflow.add_edge("analyze_post", END)
+        workflow.add_edge("generate_image", END)
 
         return workflow.compile()
 
-    def generate_post(self, request: PostGenerationRequest) -> GeneratedPost:
-        """生成完整的貼文"""
-        # 初始化狀態
-        initial_state: AIPostState = {
+    @staticmethod
+    def _initial_state(request: PostGenerationRequest) -> AIPostState:
+        """建立工作流程的初始狀態"""
+        return {
             "request": request,
             "generated_content": "",
             "generated_title": "",
@@ -579,42 +980,248 @@ class AIPostWorkflow:
             "errors": []
         }
 
-        # 執行工作流程
+    def _build_result(self, final_state: AIPostState) -> GeneratedPost:
+        """由工作流程的最終狀態構建回傳結果"""
+        return GeneratedPost(
+            title=final_state.get("generated_title", ""),
+            content=final_state.get("generated_content", ""),
+            hashtags=final_state.get("hashtags", []),
+            predicted_engagement=final_state.get("engagement_prediction", {}),
+            optimization_tips=final_state.get("optimization_tips", []),
+            image_url=final_state.get("image_url"),
+            image_description=final_state.get("image_description"),
+            generation_metadata={
+                "errors": final_state.get("errors", []),
+                "generation_time": datetime.now().isoformat(),
+                "model_used": self.config.get("default_model", "unknown"),
+                "image_generated": final_state.get("image_url") is not None
+            }
+        )
+
+    @staticmethod
+    def _fallback_result(request: PostGenerationRequest, error: Exception) -> GeneratedPost:
+        """工作流程失敗時的基本結果"""
+        return GeneratedPost(
+            title=f"關於{request.topic}的分享",
+            content=f"想要分享一些關於{request.topic}的精彩內容...",
+            hashtags=[f"#{request.topic}"],
+            predicted_engagement={"overall": 5.0},
+            optimization_tips=["請檢查 AI 配置設定"],
+            generation_metadata={
+                "errors": [f"生成過程發生錯誤: {str(error)}"],
+                "generation_time": datetime.now().isoformat()
+            }
+        )
+
+    def generate_post(self, request: PostGenerationRequest) -> GeneratedPost:
+        """生成完整的貼文（同步介面）"""
+        return _run_async(self.agenerate_post(request))
+
+    async def agenerate_post(self, request: PostGenerationRequest) -> GeneratedPost:
+        """以非同步方式生成完整的貼文"""
         try:
-            final_state = self.workflow.invoke(initial_state)
-
-            # 構建回傳結果
-            result = GeneratedPost(
-                title=final_state.get("generated_title", ""),
-                content=final_state.get("generated_content", ""),
-                hashtags=final_state.get("hashtags", []),
-                predicted_engagement=final_state.get("engagement_prediction", {}),
-                optimization_tips=final_state.get("optimization_tips", []),
-                image_url=final_state.get("image_url"),
-                image_description=final_state.get("image_description"),
+            final_state = await self.workflow.ainvoke(self._initial_state(request), config=self.run_config)
+            return self._build_result(final_state)
+        except Exception as e:
+            # 如果工作流程失敗，返回基本結果
+            return self._fallback_result(request, e)
+
+    def generate_posts_batch(self, requests: List[PostGenerationRequest]) -> List[GeneratedPost]:
+        """批次生成多篇貼文（同步介面），例如同一主題的多個版本"""
+        return _run_async(self.agenerate_posts_batch(requests))
+
+    async def agenerate_posts_batch(self, requests: List[PostGenerationRequest]) -> List[GeneratedPost]:
+        """以非同步方式批次生成多篇貼文，各工作流程並行執行，結果順序與請求相同"""
+        final_states = await self.workflow.abatch(
+            [self._initial_state(request) for request in requests],
+            config={**self.run_config, "max_concurrency": self.config.get("llm_model_max_async", 8)},
+            return_exceptions=True
+        )
+        return [
+            self._fallback_result(request, state) if isinstance(state, Exception) else self._build_result(state)
+            for request, state in zip(requests, final_states)
+        ]
+
+    def generate_posts_batched(self, requests: List[PostGenerationRequest],
+                               batch_size: int = MAX_BATCH_TOPICS) -> List[GeneratedPost]:
+        """將多個主題合併進同一提示詞生成貼文（同步介面）"""
+        return _run_async(self.agenerate_posts_batched(requests, batch_size))
+
+    async def agenerate_posts_batched(self, requests: List[PostGenerationRequest],
+                                      batch_size: int = MAX_BATCH_TOPICS) -> List[GeneratedPost]:
+        """
+        將多個主題合併進同一提示詞生成貼文
+
+        每 batch_size 個主題只呼叫一次 LLM，分攤每次請求的固定延遲與速率限制；
+        各批次之間並行執行。受眾、類型、語調等設定取自每批的第一個請求。
+        每批的主題數另受 MAX_BATCH_OUTPUT_TOKENS 限制，確保完整輸出不會被截斷。
+        批次模式只生成標題、內容與標籤，不進行貼文分析與配圖。
+        """
+        if not requests:
+            return []
+
+        per_post_tokens = self._batch_tokens_per_post(requests[0])
+        batch_size = max(1, min(batch_size, MAX_BATCH_TOPICS, MAX_BATCH_OUTPUT_TOKENS // per_post_tokens))
+        chunks = [requests[i:i + batch_size] for i in range(0, len(requests), batch_size)]
+        results = await asyncio.gather(*(self._agenerate_chunk(chunk) for chunk in chunks))
+        return [post for chunk_posts in results for post in chunk_posts]
+
+    @staticmethod
+    def _batch_tokens_per_post(request: PostGenerationRequest) -> int:
+        """估算批次生成中單篇貼文需要的輸出 token 數"""
+        return request.max_length * BATCH_TOKENS_PER_CHAR + BATCH_TOKENS_PER_POST_OVERHEAD
+
+    @staticmethod
+    def _normalize_topic(topic: str) -> str:
+        """去除主題前後空白與模型可能照抄的列表編號（例如「1. 」、「2、」）"""
+        return _LIST_MARKER_RE.sub("", topic.strip()).strip()
+
+    @staticmethod
+    def _match_drafts(requests: List[PostGenerationRequest],
+                      drafts: List[BatchPostDraft]) -> List[Optional[BatchPostDraft]]:
+        """
+        將批次回應的貼文對應回請求，找不到對應的請求為 None
+
+        依序以主題文字、主題編號比對，每篇貼文只使用一次；
+        回應篇數與請求數相同時，其餘未對應的請求再依排列位置取用。
+        """
+        normalize = AIPostWorkflow._normalize_topic
+        matched: List[Optional[int]] = [None] * len(requests)
+        used = set()
+
+        def assign(i: int, j: int):
+            matched[i] = j
+            used.add(j)
+
+        for i, request in enumerate(requests):
+            topic = normalize(request.topic)
+            j = next((j for j, draft in enumerate(drafts)
+                      if j not in used and normalize(draft.topic) == topic), None)
+            if j is not None:
+                assign(i, j)
+
+        for i in range(len(requests)):
+            if matched[i] is None:
+                j = next((j for j, draft in enumerate(drafts)
+                          if j not in used and draft.index == i + 1), None)
+                if j is not None:
+                    assign(i, j)
+
+        if len(drafts) == len(requests):
+            for i in range(len(requests)):
+                if matched[i] is None and i not in used:
+                    assign(i, i)
+
+        return [drafts[j] if j is not None else None for j in matched]
+
+    async def _agenerate_chunk(self, requests: List[PostGenerationRequest]) -> List[GeneratedPost]:
+        """以一次 LLM 呼叫生成一批主題的貼文"""
+        first = requests[0]
+        # 共用的 LLM 以單篇貼文設定 max_tokens，批次呼叫依主題數提高輸出上限；
+        # 淺複製沿用原本的用戶端與連線池
+        budget = len(requests) * self._batch_tokens_per_post(first)
+        llm = self.llm.model_copy(update={"max_tokens": max(budget, self.llm.max_tokens or 0)})
+        try:
+            formatted_prompt = _BATCH_PROMPT.format_messages(
+                target_audience=first.target_audience,
+                post_type=first.post_type,
+                tone=first.tone,
+                max_length=first.max_length,
+                include_emoji="是" if first.include_emoji else "否",
+                count=len(requests),
+                topics="\n".join(f"{i + 1}. {request.topic}" for i, request in enumerate(requests))
+            )
+            batch = await _cached_ainvoke(
+                llm, formatted_prompt, cache_ok=first.cache_ok, schema=PostBatch
+            )
+        except Exception as e:
+            return [self._fallback_result(request, e) for request in requests]
+
+        generated_posts = []
+        for request, draft in zip(requests, self._match_drafts(requests, batch.posts)):
+            if draft is None:
+                generated_posts.append(self._fallback_result(request, ValueError("批次回應缺少此主題的貼文")))
+                continue
+
+            hashtags = []
+            if request.include_hashtags:
+                hashtags = [tag.strip() for tag in draft.hashtags if tag.strip()]
+                hashtags = [tag if tag.startswith('#') else f'#{tag}' for tag in hashtags]
+
+            generated_posts.append(GeneratedPost(
+                title=draft.title.strip(),
+                content=draft.content.strip(),
+                hashtags=hashtags,
                 generation_metadata={
-                    "errors": final_state.get("errors", []),
+                    "errors": [],
                     "generation_time": datetime.now().isoformat(),
                     "model_used": self.config.get("default_model", "unknown"),
-                    "image_generated": final_state.get("image_url") is not None
+                    "image_generated": False,
+                    "batched": True
                 }
-            )
+            ))
+        return generated_posts
 
-            return result
+    async def astream_post(self, request: PostGenerationRequest) -> AsyncIterator[Tuple[str, Any]]:
+        """串流生成貼文
+
+        貼文內容生成期間逐段產出 ("token", 文字)，工作流程結束後產出 ("post", GeneratedPost)。
+        """
+        try:
+            final_state = None
+            async for mode, payload in self.workflow.astream(
+                self._initial_state(request), config=self.run_config, stream_mode=["messages", "values"]
+            ):
+                if mode == "values":
+                    final_state = payload
+                    continue
+
+                chunk, metadata = payload
+                if metadata.get("langgraph_node") != "generate_content":
+                    continue
+
+                text = chunk.content
+                if isinstance(text, list):
+                    # Claude 的串流片段為內容區塊列表
+                    text = "".join(part.get("text", "") for part in text if isinstance(part, dict))
+                if text:
+                    yield "token", text
+
+            yield "post", self._build_result(final_state)
 
         except Exception as e:
-            # 如果工作流程失敗，返回基本結果
-            return GeneratedPost(
-                title=f"關於{request.topic}的分享",
-                content=f"想要分享一些關於{request.topic}的精彩內容...",
-                hashtags=[f"#{request.topic}"],
-                predicted_engagement={"overall": 5.0},
-                optimization_tips=["請檢查 AI 配置設定"],
-                generation_metadata={
-                    "errors": [f"生成過程發生錯誤: {str(e)}"],
-                    "generation_time": datetime.now().isoformat()
-                }
-            )
+            yield "post", self._fallback_result(request, e)
+
+    def stream_post(self, request: PostGenerationRequest) -> Iterator[Tuple[str, Any]]:
+        """串流生成貼文（同步介面），事件格式同 astream_post
+
+        工作流程在背景事件迴圈上執行，事件經由佇列交回呼叫端執行緒，
+        讓 Streamlit 能在自己的執行緒中更新畫面。
+        """
+        events: queue.Queue = queue.Queue()
+
+        async def produce():
+            try:
+                async for event in self.astream_post(request):
+                    events.put(event)
+            finally:
+                events.put(None)
+
+        future = asyncio.run_coroutine_threadsafe(produce(), _get_event_loop())
+        while (event := events.get()) is not None:
+            yield event
+        future.result()
+
+@st.cache_resource
+def get_workflow() -> AIPostWorkflow:
+    """
+    取得跨 Streamlit 重新執行共用的工作流程實例
+
+    呼叫端應使用此函數而非直接建立 AIPostWorkflow，
+    以沿用已編譯的工作流程圖、LLM 用戶端與連線池。
+    配置變更後由 show_ai_config 清除快取。
+    """
+    return AIPostWorkflow()
 
 def show_ai_config():
     """顯示 AI 配置頁面"""
@@ -684,18 +1291,44 @@ def show_ai_config():
                 value=config.get("enable_image_generation", True)
             )
 
+        st.markdown("### 語意快取")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            enable_semantic_cache = st.checkbox(
+                "啟用語意快取",
+                value=config.get("enable_semantic_cache", False),
+                help="主題相近的請求直接重用先前生成的標題與內容（需要 OpenAI API Key；創意度大於 0 時不使用）"
+            )
+
+        with col2:
+            similarity_threshold = st.slider(
+                "相似度門檻",
+                min_value=0.80,
+                max_value=1.0,
+                value=float(config.get("similarity_threshold", 0.92)),
+                step=0.01,
+                help="數值越高，只有越相近的請求才會重用快取"
+            )
+
         if st.form_submit_button("💾 保存配置", type="primary"):
+            # 保留表單未涵蓋的設定項目（例如 llm_model_max_async）
             new_config = {
+                **config,
                 "openai_api_key": openai_key,
                 "anthropic_api_key": anthropic_key,
                 "default_model": default_model,
                 "image_model": image_model,
                 "temperature": temperature,
                 "max_tokens": max_tokens,
-                "enable_image_generation": enable_image
+                "enable_image_generation": enable_image,
+                "enable_semantic_cache": enable_semantic_cache,
+                "similarity_threshold": similarity_threshold
             }
 
             AIConfigManager.save_config(new_config)
+            # 以新配置重建工作流程
+            get_workflow.clear()
             st.success("✅ 配置已保存")
             st.rerun()
 
@@ -705,5 +1338,7 @@ __all__ = [
     "GeneratedPost",
     "AIPostWorkflow",
     "AIConfigManager",
+    "MAX_BATCH_TOPICS",
+    "get_workflow",
     "show_ai_config"
 ]
\ No newline at end of file
@@ -16,36 +16,39 @@ AI 自動化 Facebook 發文系統 - Streamlit MVP
 @created 2024-01-20
 @updated 2024-01-20
 
-@requires streamlit>=1.29.0
+@requires streamlit>=1.37.0
 @requires pydantic>=2.0.0
+@requires orjson>=3.9.0
 @requires langchain>=0.2.0
 @requires langgraph>=0.2.0
 """
 
-import json
+import importlib
+import importlib.util
+import math
 import os
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import shutil
+import sys
+import threading
+import orjson
 import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional
-from pydantic import BaseModel
-
-# AI 相關導入
-try:
-    from ai_post_generator import (
-        PostGenerationRequest,
-        GeneratedPost,
-        AIPostWorkflow,
-        AIConfigManager,
-        show_ai_config
-    )
-    AI_AVAILABLE = True
-except ImportError as e:
-    AI_AVAILABLE = False
-    print(f"AI 功能不可用: {e}")
+from typing import TYPE_CHECKING, Dict, Final, List, Optional, TextIO, Tuple
+from pydantic import BaseModel, TypeAdapter, model_validator
+
+# pandas 與 Plotly 僅儀表板與貼文列表使用，於函數內延遲導入以加快其他頁面的啟動
+if TYPE_CHECKING:
+    import pandas as pd
+    import plotly.graph_objects as go
+
+# ai_post_generator 導入時需要的全部第三方套件，用於不導入模組即可判斷 AI 功能是否可用；
+# 模組新增導入時須同步更新
+AI_DEPENDENCIES = (
+    "langchain", "langchain_core", "langchain_openai", "langchain_anthropic", "langgraph",
+    "openai", "anthropic", "aiohttp", "aiofiles", "httpx", "tenacity", "orjson", "numpy"
+)
 
 # 頁面配置
 st.set_page_config(
@@ -57,11 +60,40 @@ st.set_page_config(
 
 # 數據存儲設定
 DATA_DIR = Path("data")
-POSTS_FILE = DATA_DIR / "posts.json"
+POSTS_FILE = DATA_DIR / "posts.json"  # 舊版格式，僅用於遷移
+POSTS_LOG_FILE = DATA_DIR / "posts.jsonl"
 SETTINGS_FILE = DATA_DIR / "settings.json"
 
-# 確保數據目錄存在
-DATA_DIR.mkdir(exist_ok=True)
+# AI 多版本生成的版本數
+VARIANT_COUNT = 3
+
+# 上傳圖片寫入磁碟的區塊大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# 上傳圖片保存時的最大邊長（像素）
+UPLOAD_MAX_PX = 1600
+
+# 預覽縮圖的最大邊長（像素）
+THUMBNAIL_MAX_PX = 800
+
+# 貼文狀態的顯示圖示與文字
+STATUS_COLORS: Final = {
+    "published": "🟢",
+    "draft": "⚪",
+    "scheduled": "🟡",
+    "failed": "🔴"
+}
+STATUS_TEXTS: Final = {
+    "published": "已發布",
+    "draft": "草稿",
+    "scheduled": "已排程",
+    "failed": "發布失敗"
+}
+# 篩選下拉選單文字對應的狀態
+STATUS_FILTERS: Final = {"已發布": "published", "草稿": "draft", "已排程": "scheduled", "失敗": "failed"}
+
+# 貼文列表每頁筆數選項
+PAGE_SIZE_OPTIONS = [25, 50, 100]
 
 class Post(BaseModel):
     """貼文資料模型"""
@@ -73,7 +105,11 @@ class Post(BaseModel):
     created_time: str
     updated_time: str
     facebook_post_id: Optional[str] = None
-    engagement_stats: Dict = {}
+    # 互動數據
+    likes: int = 0
+    comments: int = 0
+    shares: int = 0
+    views: int = 0
     # AI 生成相關欄位
     hashtags: List[str] = []
     predicted_engagement: Dict[str, float] = {}
@@ -83,38 +119,218 @@ class Post(BaseModel):
     ai_generated: bool = False
     generation_metadata: Dict = {}
 
+    @model_validator(mode="before")
+    @classmethod
+    def normalize_record(cls, data):
+        """
+        正規化原始記錄
+
+        - 將舊版的 engagement_stats 字典展開為獨立的互動欄位
+        - 駐留 (intern) 狀態字串，讓篩選時的比較可直接比對指標
+        """
+        if not isinstance(data, dict):
+            return data
+
+        data = dict(data)
+        if "engagement_stats" in data:
+            stats = data.pop("engagement_stats") or {}
+            for field in ("likes", "comments", "shares", "views"):
+                data.setdefault(field, stats.get(field, 0))
+        if isinstance(data.get("status"), str):
+            data["status"] = sys.intern(data["status"])
+        return data
+
+# 整批驗證貼文清單，由 pydantic-core 一次完成解析與驗證
+POSTS_ADAPTER = TypeAdapter(List[Post])
+
+class PostStore:
+    """
+    貼文存儲（append-only JSONL 日誌 + 記憶體索引）
+
+    每次異動只追加一行記錄：{"op": "upsert", "post": {...}} 或 {"op": "delete", "id": n}，
+    啟動時重播日誌建立以 ID 為鍵的索引；追加行數超過有效貼文數兩倍時壓縮日誌。
+    壓縮後的日誌首行為 {"op": "meta", "next_id": n}，確保已刪除貼文的 ID 不會被重複使用。
+    """
+
+    def __init__(self, log_file: Path = POSTS_LOG_FILE, legacy_file: Path = POSTS_FILE):
+        self.log_file = log_file
+        # 每個程序只建立一次，不在每次重新執行時檢查數據目錄
+        self.log_file.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index: Dict[int, Post] = {}
+        self._appends = 0
+        self._next_id = 1
+        # 每次異動遞增，作為衍生資料（統計、圖表）的快取鍵
+        self.revision = 0
+
+        if self.log_file.exists():
+            self._replay()
+        elif legacy_file.exists():
+            # 由舊版 posts.json 遷移
+            self._import_legacy(legacy_file)
+
+        # 首次追加時才開啟日誌，避免舊版檔案匯入失敗時留下空的日誌而遮蔽舊版檔案
+        self._file: Optional[TextIO] = None
+
+    def _replay(self):
+        """
+        重播日誌建立索引
+
+        最後一行缺少換行符號表示寫入中斷：記錄完整時補上換行，否則截去該行，
+        避免之後追加的記錄接在殘缺的行尾而在下次重播時一併被略過。
+        """
+        with open(self.log_file, 'rb+') as f:
+            offset = 0
+            for line in f:
+                line_start, offset = offset, offset + len(line)
+                try:
+                    record = orjson.loads(line)
+                except ValueError:
+                    if not line.endswith(b"\n"):
+                        f.truncate(line_start)
+                        break
+                    # 略過寫入中斷的不完整記錄
+                    continue
+
+                if not line.endswith(b"\n"):
+                    f.seek(0, os.SEEK_END)
+                    f.write(b"\n")
+
+                op = record.get("op")
+                if op == "meta":
+                    self._next_id = max(self._next_id, record["next_id"])
+                    continue
+
+                if op == "delete":
+                    self._index.pop(record["id"], None)
+                else:
+                    # 日誌內容皆於寫入前驗證，不需重新驗證
+                    post = Post.model_construct(**Post.normalize_record(record["post"]))
+                    self._index[post.id] = post
+                    self._next_id = max(self._next_id, post.id + 1)
+                self._appends += 1
+
+    def _import_legacy(self, legacy_file: Path):
+        """匯入舊版 JSON 陣列格式的貼文檔案"""
+        try:
+            with open(legacy_file, 'rb') as f:
+                posts = POSTS_ADAPTER.validate_json(f.read())
+        except Exception as e:
+            # 不寫入日誌，修正舊版檔案後重新啟動即可再次匯入
+            st.error(f"載入貼文數據失敗: {e}")
+            return
+
+        self._index = {post.id: post for post in posts}
+        self._next_id = max(self._index, default=0) + 1
+        self._rewrite()
+
+    @staticmethod
+    def _upsert_line(post: Post) -> str:
+        # 由 pydantic-core 直接序列化，不經過中間的 dict
+        return f'{{"op": "upsert", "post": {post.model_dump_json()}}}\n'
+
+    def _rewrite(self):
+        """以目前索引重寫日誌（壓縮）"""
+        tmp_file = self.log_file.with_suffix(".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(orjson.dumps({"op": "meta", "next_id": self._next_id}).decode() + "\n")
+            f.writelines(self._upsert_line(post) for post in self._index.values())
+        os.replace(tmp_file, self.log_file)
+        self._appends = len(self._index)
+
+    def _compact(self):
+        """關閉日誌檔案後重寫，無論重寫成功與否都重新開啟，讓後續追加仍可寫入"""
+        if self._file is not None:
+            self._file.close()
+        try:
+            self._rewrite()
+        finally:
+            self._file = open(self.log_file, 'a', encoding='utf-8')
+
+    def _append(self, line: str):
+        """追加一行記錄"""
+        if self._file is None:
+            self._file = open(self.log_file, 'a', encoding='utf-8')
+        self._file.write(line)
+        self._file.flush()
+        self._appends += 1
+
+    def _compact_if_needed(self):
+        """追加行數超過有效貼文數兩倍時壓縮日誌"""
+        if self._appends > 2 * len(self._index):
+            self._compact()
+
+    def all(self) -> List[Post]:
+        """取得所有貼文"""
+        with self._lock:
+            return list(self._index.values())
+
+    def __len__(self) -> int:
+        """有效貼文數"""
+        return len(self._index)
+
+    def get(self, post_id: int) -> Optional[Post]:
+        """依 ID 取得貼文"""
+        return self._index.get(post_id)
+
+    def allocate_id(self) -> int:
+        """配發下一個貼文 ID（單調遞增）"""
+        with self._lock:
+            post_id = self._next_id
+            self._next_id += 1
+            return post_id
+
+    def upsert(self, post: Post):
+        """新增或更新貼文"""
+        with self._lock:
+            self._index[post.id] = post
+            self._next_id = max(self._next_id, post.id + 1)
+            self._append(self._upsert_line(post))
+            # 先遞增版本再壓縮：記錄已寫入日誌，壓縮失敗時衍生資料的快取仍須失效
+            self.revision += 1
+            self._compact_if_needed()
+
+    def delete(self, post_id: int):
+        """刪除貼文"""
+        with self._lock:
+            if self._index.pop(post_id, None) is not None:
+                self._append(orjson.dumps({"op": "delete", "id": post_id}).decode() + "\n")
+                self.revision += 1
+                self._compact_if_needed()
+
+    def replace_all(self, posts: List[Post]):
+        """以指定的貼文清單取代全部內容"""
+        with self._lock:
+            self._index = {post.id: post for post in posts}
+            self._next_id = max(self._next_id, max(self._index, default=0) + 1)
+            self.revision += 1
+            self._compact()
+
+@st.cache_resource
+def get_post_store() -> PostStore:
+    """取得跨 Streamlit 重新執行共用的貼文存儲"""
+    return PostStore()
+
 class PostManager:
     """貼文管理器"""
 
     @staticmethod
     def load_posts() -> List[Post]:
         """載入貼文數據"""
-        if not POSTS_FILE.exists():
-            return []
-
-        try:
-            with open(POSTS_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return [Post(**post_data) for post_data in data]
-        except Exception as e:
-            st.error(f"載入貼文數據失敗: {e}")
-            return []
+        return get_post_store().all()
 
     @staticmethod
     def save_posts(posts: List[Post]):
-        """保存貼文數據"""
+        """保存貼文數據（整批取代）"""
         try:
-            with open(POSTS_FILE, 'w', encoding='utf-8') as f:
-                json.dump([post.model_dump() for post in posts], f, ensure_ascii=False, indent=2)
+            get_post_store().replace_all(posts)
         except Exception as e:
             st.error(f"保存貼文數據失敗: {e}")
 
     @staticmethod
-    def get_next_id(posts: List[Post]) -> int:
+    def get_next_id() -> int:
         """獲取下一個可用的 ID"""
-        if not posts:
-            return 1
-        return max([p.id for p in posts]) + 1
+        return get_post_store().allocate_id()
 
     @staticmethod
     def create_post(title: str, content: str, status: str = "draft", scheduled_time: Optional[str] = None,
@@ -123,8 +339,7 @@ class PostManager:
                    image_description: Optional[str] = None, ai_generated: bool = False,
                    generation_metadata: Optional[Dict] = None) -> Post:
         """創建新貼文"""
-        posts = PostManager.load_posts()
-        next_id = PostManager.get_next_id(posts)
+        next_id = PostManager.get_next_id()
 
         now = datetime.now().isoformat()
         post = Post(
@@ -144,10 +359,35 @@ class PostManager:
             generation_metadata=generation_metadata or {}
         )
 
-        posts.append(post)
-        PostManager.save_posts(posts)
+        try:
+            get_post_store().upsert(post)
+        except Exception as e:
+            st.error(f"保存貼文數據失敗: {e}")
         return post
 
+    @staticmethod
+    def delete_post(post_id: int):
+        """刪除貼文"""
+        get_post_store().delete(post_id)
+
+@st.cache_resource(show_spinner=False)
+def _get_ai():
+    """
+    延遲導入 AI 模組（LangChain、LangGraph 等），首次進入 AI 頁面時才載入
+
+    依賴套件未安裝時回傳 None。
+    """
+    try:
+        return importlib.import_module("ai_post_generator")
+    except ImportError as e:
+        print(f"AI 功能不可用: {e}")
+        return None
+
+@st.cache_resource(show_spinner=False)
+def ai_available() -> bool:
+    """僅檢查 AI 依賴套件是否已安裝，不實際導入"""
+    return all(importlib.util.find_spec(name) is not None for name in AI_DEPENDENCIES)
+
 def show_create_post():
     """顯示創建貼文頁面"""
     st.markdown('<h1 style="text-align: center; color: #1f77b4;">📝 創建新貼文</h1>', unsafe_allow_html=True)
@@ -162,8 +402,9 @@ def show_create_post():
         show_manual_creation_tab()
 
     with tab3:
-        if AI_AVAILABLE:
-            show_ai_config()
+        ai = _get_ai()
+        if ai is not None:
+            ai.show_ai_config()
         else:
             st.error("AI 功能不可用，請檢查依賴套件是否正確安裝")
 
@@ -171,12 +412,13 @@ def show_ai_generation_tab():
     """顯示 AI 生成標籤頁"""
     st.markdown("### 🤖 使用 AI 生成高轉化率貼文")
 
-    if not AI_AVAILABLE:
+    ai = _get_ai()
+    if ai is None:
         st.warning("AI 功能不可用，請檢查相關依賴套件")
         return
 
     # 檢查 AI 配置
-    config = AIConfigManager.load_config()
+    config = ai.AIConfigManager.load_config()
     if not config.get("openai_api_key") and not config.get("anthropic_api_key"):
         st.warning("請先在「AI 設定」標籤頁配置 API 金鑰")
         return
@@ -224,36 +466,107 @@ def show_ai_generation_tab():
                 help="使用 AI 生成與貼文相關的配圖"
             )
 
+        # 批次生成：多個主題合併進同一提示詞，分攤每次呼叫的固定延遲
+        with st.expander("📦 批次生成多個主題"):
+            batch_topics = st.text_area(
+                "批次主題（每行一個）",
+                placeholder="例如：\n夏季新品上市\n會員日優惠\n使用小技巧分享",
+                help="每行一個主題，共用上方的受眾、類型與語調設定；批次模式不生成配圖"
+            )
+
+            batch_size = st.slider(
+                "每次呼叫合併的主題數",
+                min_value=1,
+                max_value=ai.MAX_BATCH_TOPICS,
+                value=4,
+                help="合併越多主題呼叫次數越少，但超過數個後效益遞減；單篇字數較多時會自動減少每批主題數"
+            )
+
+            batch_btn = st.form_submit_button("📦 批次生成", use_container_width=True)
+
         # 生成按鈕
-        generate_btn = st.form_submit_button(
-            "🚀 AI 生成貼文",
-            type="primary",
-            use_container_width=True
-        )
+        btn_col1, btn_col2 = st.columns(2)
+
+        with btn_col1:
+            generate_btn = st.form_submit_button(
+                "🚀 AI 生成貼文",
+                type="primary",
+                use_container_width=True
+            )
+
+        with btn_col2:
+            variants_btn = st.form_submit_button(
+                f"🎲 生成 {VARIANT_COUNT} 個版本",
+                use_container_width=True
+            )
+
+        def build_request(request_topic: str):
+            """以表單設定創建生成請求"""
+            return ai.PostGenerationRequest(
+                topic=request_topic,
+                target_audience=target_audience,
+                post_type=post_type,
+                tone=tone,
+                include_hashtags=include_hashtags,
+                include_emoji=True,
+                max_length=300,
+                generate_image=generate_image,
+                image_style="現代簡約"
+            )
+
+        # 處理批次生成
+        if batch_btn:
+            topics = [line.strip() for line in batch_topics.splitlines() if line.strip()]
+            if not topics:
+                st.error("請至少填寫一個批次主題")
+            else:
+                with st.spinner(f"AI 正在批次生成 {len(topics)} 篇貼文..."):
+                    try:
+                        generated_posts = ai.get_workflow().generate_posts_batched(
+                            [build_request(batch_topic) for batch_topic in topics], batch_size
+                        )
+                        tabs = st.tabs([f"{i + 1}. {batch_topic}" for i, batch_topic in enumerate(topics)])
+                        for i, (tab, generated_post) in enumerate(zip(tabs, generated_posts)):
+                            with tab:
+                                show_generated_post_preview(generated_post, key_prefix=f"batch_{i}_")
+                    except Exception as e:
+                        st.error(f"AI 生成失敗: {str(e)}")
+                        st.info("請檢查 AI 配置設定或網路連線")
 
         # 處理表單提交
-        if generate_btn:
+        if generate_btn or variants_btn:
             if not topic:
                 st.error("請填寫貼文主題")
             else:
                 with st.spinner("AI 正在生成貼文內容..."):
                     try:
                         # 創建生成請求
-                        request = PostGenerationRequest(
-                            topic=topic,
-                            target_audience=target_audience,
-                            post_type=post_type,
-                            tone=tone,
-                            include_hashtags=include_hashtags,
-                            include_emoji=True,
-                            max_length=300,
-                            generate_image=generate_image,
-                            image_style="現代簡約"
-                        )
+                        request = build_request(topic)
+
+                        workflow = ai.get_workflow()
+
+                        # 多版本模式：各版本的工作流程並行執行
+                        if variants_btn:
+                            generated_posts = workflow.generate_posts_batch([request] * VARIANT_COUNT)
+                            tabs = st.tabs([f"版本 {i + 1}" for i in range(VARIANT_COUNT)])
+                            for i, (tab, generated_post) in enumerate(zip(tabs, generated_posts)):
+                                with tab:
+                                    show_generated_post_preview(generated_post, key_prefix=f"variant_{i}_")
+                            return
+
+                        # 執行 AI 生成，貼文內容邊生成邊顯示
+                        placeholder = st.empty()
+                        streamed_content = ""
+                        generated_post = None
 
-                        # 執行 AI 生成
-                        workflow = AIPostWorkflow()
-                        generated_post = workflow.generate_post(request)
+                        for event_type, payload in workflow.stream_post(request):
+                            if event_type == "token":
+                                streamed_content += payload
+                                placeholder.markdown(streamed_content)
+                            else:
+                                generated_post = payload
+
+                        placeholder.empty()
 
                         # 顯示生成結果
                         show_generated_post_preview(generated_post)
@@ -262,8 +575,26 @@ def show_ai_generation_tab():
                         st.error(f"AI 生成失敗: {str(e)}")
                         st.info("請檢查 AI 配置設定或網路連線")
 
-def show_generated_post_preview(generated_post):
-    """顯示生成的貼文預覽"""
+@st.cache_data(show_spinner=False)
+def get_thumbnail(path: str, mtime_ns: int, max_px: int = THUMBNAIL_MAX_PX) -> bytes:
+    """
+    產生圖片縮圖（JPEG），每張圖片只解碼與縮放一次
+
+    mtime_ns 僅作為快取鍵，圖片檔案變更時重新產生。
+    """
+    from io import BytesIO
+    from PIL import Image
+
+    with Image.open(path) as image:
+        # JPEG 於解碼時即按比例縮小
+        image.draft("RGB", (max_px, max_px))
+        image.thumbnail((max_px, max_px), Image.Resampling.LANCZOS)
+        buffer = BytesIO()
+        image.convert("RGB").save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+def show_generated_post_preview(generated_post, key_prefix: str = ""):
+    """顯示生成的貼文預覽，同頁顯示多個預覽時以 key_prefix 區分按鈕"""
     st.markdown("---")
     st.markdown("### 🎯 AI 生成結果")
 
@@ -297,9 +628,9 @@ def show_generated_post_preview(generated_post):
         if generated_post.image_url:
             st.markdown("**配圖：**")
             try:
-                from PIL import Image
-                image = Image.open(generated_post.image_url)
-                st.image(image, caption=generated_post.image_description, use_column_width=True)
+                image_path = Path(generated_post.image_url)
+                thumbnail = get_thumbnail(str(image_path), image_path.stat().st_mtime_ns)
+                st.image(thumbnail, caption=generated_post.image_description, use_column_width=True)
             except Exception as e:
                 st.error(f"無法顯示配圖: {e}")
 
@@ -324,7 +655,7 @@ def show_generated_post_preview(generated_post):
     col1, col2 = st.columns(2)
 
     with col1:
-        if st.button("✅ 保存貼文", type="primary", key="save_ai_post"):
+        if st.button("✅ 保存貼文", type="primary", key=f"{key_prefix}save_ai_post"):
             try:
                 post = PostManager.create_post(
                     title=generated_post.title,
@@ -345,9 +676,53 @@ def show_generated_post_preview(generated_post):
                 st.error(f"保存失敗：{e}")
 
     with col2:
-        if st.button("🔄 重新生成", key="regenerate_post"):
+        if st.button("🔄 重新生成", key=f"{key_prefix}regenerate_post"):
             st.rerun()
 
+@st.cache_resource
+def get_io_executor() -> ThreadPoolExecutor:
+    """取得跨重新執行共用的檔案寫入執行緒池"""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="upload-writer")
+
+def _save_upload(uploaded_file, image_path: Path):
+    """以 1 MiB 區塊將上傳的檔案寫入磁碟，不一次複製整個緩衝區"""
+    uploaded_file.seek(0)
+    with open(image_path, "wb") as f:
+        shutil.copyfileobj(uploaded_file, f, UPLOAD_CHUNK_SIZE)
+
+    _shrink_upload(image_path)
+
+def _shrink_upload(image_path: Path, max_px: int = UPLOAD_MAX_PX):
+    """
+    將過大的上傳圖片縮小後覆寫原檔
+
+    JPEG 以 draft 模式在解碼時即按 DCT 比例縮小，只解碼所需的區塊。
+    縮小前先依 EXIF 方向旋轉像素，並保留其餘 EXIF 資料，避免直向拍攝的照片變成橫向。
+    GIF（可能為動畫）與無法處理的格式保留原檔。
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(image_path) as image:
+            image_format = image.format
+            if image_format == "GIF" or max(image.size) <= max_px:
+                return
+
+            # draft 只在縮小後兩邊仍不小於要求尺寸時生效，須傳入與原圖等比例的目標尺寸
+            scale = max_px / max(image.size)
+            image.draft("RGB", (round(image.width * scale), round(image.height * scale)))
+            # exif_transpose 回傳已旋轉的影像，其 EXIF 已移除方向標記
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((max_px, max_px), Image.Resampling.LANCZOS)
+
+            save_options = {"format": image_format, "optimize": True, "quality": 85}
+            if image.info.get("exif"):
+                save_options["exif"] = image.info["exif"]
+            image.save(image_path, **save_options)
+    except Exception:
+        # 縮圖失敗時保留原始上傳檔案
+        pass
+
 def show_manual_creation_tab():
     """顯示手動創建標籤頁"""
     st.markdown("### ✍️ 手動創建貼文")
@@ -387,8 +762,9 @@ def show_manual_creation_tab():
                 try:
                     # 處理上傳的圖片
                     image_url = None
+                    write_future = None
                     if uploaded_file is not None:
-                        # 保存上傳的圖片
+                        # 保存上傳的圖片（背景執行緒寫入，與建立貼文同時進行）
                         upload_dir = Path("data/uploaded_images")
                         upload_dir.mkdir(parents=True, exist_ok=True)
 
@@ -396,9 +772,7 @@ def show_manual_creation_tab():
                         filename = f"upload_{timestamp}_{uploaded_file.name}"
                         image_path = upload_dir / filename
 
-                        with open(image_path, "wb") as f:
-                            f.write(uploaded_file.getbuffer())
-
+                        write_future = get_io_executor().submit(_save_upload, uploaded_file, image_path)
                         image_url = str(image_path)
 
                     post = PostManager.create_post(
@@ -409,6 +783,17 @@ def show_manual_creation_tab():
                         ai_generated=False
                     )
 
+                    if write_future is not None:
+                        # 確認圖片寫入完成；失敗時移除剛建立的貼文與不完整的檔案，
+                        # 避免留下指向缺損圖片的貼文，重新送出時也不會產生重複貼文
+                        try:
+                            write_future.result()
+                        except Exception as e:
+                            PostManager.delete_post(post.id)
+                            image_path.unlink(missing_ok=True)
+                            st.error(f"圖片保存失敗，貼文未建立，請重新上傳：{e}")
+                            return
+
                     st.success(f"✅ 成功創建貼文：{post.title}")
                     st.balloons()
                     st.rerun()
@@ -416,13 +801,40 @@ def show_manual_creation_tab():
                 except Exception as e:
                     st.error(f"創建貼文失敗：{e}")
 
+@st.cache_data(show_spinner=False)
+def _posts_frame(revision: int) -> "pd.DataFrame":
+    """
+    貼文列表用的 DataFrame，貼文未異動時直接使用快取
+
+    建立時間整欄一次解析與格式化，並預先建立小寫的搜尋欄位供向量化篩選，
+    以及列表顯示用的內容預覽（前 100 字）。
+    """
+    import pandas as pd
+
+    posts = PostManager.load_posts()
+    content = pd.Series([p.content for p in posts], dtype=str)
+    df = pd.DataFrame({
+        "id": [p.id for p in posts],
+        "status": [p.status for p in posts],
+        "ai_generated": pd.Series([p.ai_generated for p in posts], dtype=bool),
+        "search_blob": pd.Series([f"{p.title}\n{p.content}" for p in posts], dtype=str).str.lower(),
+        "created_time": pd.to_datetime(pd.Series([p.created_time for p in posts], dtype=str), format="ISO8601")
+    })
+    df["created_label"] = df["created_time"].dt.strftime("%m/%d %H:%M")
+    df["preview"] = content.str.slice(0, 100).where(content.str.len() <= 100, content.str.slice(0, 100) + "...")
+    return df
+
+@st.fragment
 def show_posts_list():
-    """顯示貼文列表頁面"""
+    """顯示貼文列表頁面（片段：搜尋、篩選與分頁只重新執行此頁）"""
+    import pandas as pd
+
     st.markdown('<h1 style="text-align: center; color: #1f77b4;">📝 貼文管理</h1>', unsafe_allow_html=True)
 
-    posts = PostManager.load_posts()
+    store = get_post_store()
+    frame = _posts_frame(store.revision)
 
-    if not posts:
+    if frame.empty:
         st.info("目前沒有任何貼文，請先創建一些貼文。")
         return
 
@@ -433,60 +845,63 @@ def show_posts_list():
         search_term = st.text_input("🔍 搜尋貼文", placeholder="輸入標題或內容關鍵字...")
 
     with col2:
-        status_filter = st.selectbox("篩選狀態", ["全部", "已發布", "草稿", "已排程", "失敗"])
+        status_filter = st.selectbox("篩選狀態", ["全部", *STATUS_FILTERS])
 
     with col3:
         ai_filter = st.selectbox("篩選類型", ["全部", "AI 生成", "手動創建"])
 
-    # 應用篩選
-    filtered_posts = posts
+    # 應用篩選（以布林遮罩一次完成）
+    mask = pd.Series(True, index=frame.index)
 
     if search_term:
-        filtered_posts = [p for p in filtered_posts
-                         if search_term.lower() in p.title.lower() or search_term.lower() in p.content.lower()]
+        mask &= frame["search_blob"].str.contains(search_term.lower(), regex=False)
 
     if status_filter != "全部":
-        status_map = {"已發布": "published", "草稿": "draft", "已排程": "scheduled", "失敗": "failed"}
-        filtered_posts = [p for p in filtered_posts if p.status == status_map[status_filter]]
+        mask &= frame["status"].eq(STATUS_FILTERS[status_filter])
 
     if ai_filter != "全部":
         is_ai = ai_filter == "AI 生成"
-        filtered_posts = [p for p in filtered_posts if p.ai_generated == is_ai]
+        mask &= frame["ai_generated"].eq(is_ai)
+
+    # 最新的貼文排在最前面
+    filtered = frame[mask].sort_values("created_time", ascending=False)
+
+    # 分頁，每次重新執行只渲染一頁的貼文元件
+    page_col1, page_col2, page_col3 = st.columns([2, 1, 1])
+
+    with page_col2:
+        page_size = st.selectbox("每頁筆數", PAGE_SIZE_OPTIONS)
+
+    with page_col3:
+        total_pages = max(1, math.ceil(len(filtered) / page_size))
+        page = st.number_input("頁", min_value=1, max_value=total_pages, value=1, step=1)
+
+    with page_col1:
+        st.caption(f"共 {len(filtered)} 篇貼文，第 {page}/{total_pages} 頁")
+
+    filtered = filtered.iloc[(page - 1) * page_size:page * page_size]
 
     # 顯示貼文列表
-    for post in filtered_posts:
+    for post_id, created_label, preview in zip(filtered["id"].tolist(), filtered["created_label"], filtered["preview"]):
+        post = store.get(post_id)
         with st.container():
             col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
 
             with col1:
                 ai_badge = "🤖" if post.ai_generated else "✍️"
                 st.markdown(f"### {ai_badge} {post.title}")
-                content_preview = post.content[:100] + "..." if len(post.content) > 100 else post.content
-                st.markdown(content_preview)
+                st.markdown(preview)
 
                 if post.hashtags:
                     hashtags_preview = " ".join(post.hashtags[:3])  # 顯示前3個標籤
                     st.markdown(f"🏷️ {hashtags_preview}")
 
             with col2:
-                status_colors = {
-                    "published": "🟢",
-                    "draft": "⚪",
-                    "scheduled": "🟡",
-                    "failed": "🔴"
-                }
-                status_texts = {
-                    "published": "已發布",
-                    "draft": "草稿",
-                    "scheduled": "已排程",
-                    "failed": "發布失敗"
-                }
-                status_color = status_colors.get(post.status, "❓")
-                status_text = status_texts.get(post.status, post.status)
+                status_color = STATUS_COLORS.get(post.status, "❓")
+                status_text = STATUS_TEXTS.get(post.status, post.status)
                 st.markdown(f"{status_color} {status_text}")
 
-                created_time = datetime.fromisoformat(post.created_time)
-                st.markdown(f"📅 {created_time.strftime('%m/%d %H:%M')}")
+                st.markdown(f"📅 {created_label}")
 
             with col3:
                 if post.predicted_engagement and post.predicted_engagement.get("overall"):
@@ -503,69 +918,74 @@ def show_posts_list():
 
         st.divider()
 
+@st.cache_data(show_spinner=False)
+def _dashboard_stats(revision: int) -> Dict:
+    """以單一 DataFrame 彙總儀表板統計，貼文未異動時直接使用快取"""
+    import pandas as pd
+
+    df = pd.DataFrame(
+        [(p.status, p.ai_generated) for p in PostManager.load_posts()],
+        columns=["status", "ai_generated"]
+    )
+    status_counts = df["status"].value_counts(sort=False)
+
+    return {
+        "total": len(df),
+        "published": int(status_counts.get("published", 0)),
+        "draft": int(status_counts.get("draft", 0)),
+        "ai": int(df["ai_generated"].sum()),
+        "status_counts": {STATUS_TEXTS.get(status, status): int(count) for status, count in status_counts.items()}
+    }
+
+@st.cache_data(show_spinner=False)
+def _pie_figure(counts: Tuple[Tuple[str, int], ...], title: str) -> "go.Figure":
+    """建立圓餅圖，相同數據時直接使用快取的圖表"""
+    import plotly.graph_objects as go
+
+    # 直接建立 Pie trace，省去 Plotly Express 的 DataFrame 轉換與推斷
+    fig = go.Figure(go.Pie(
+        labels=[name for name, _ in counts],
+        values=[count for _, count in counts]
+    ))
+    fig.update_layout(title=title)
+    return fig
+
+@st.fragment
 def show_dashboard():
-    """顯示儀表板頁面"""
+    """顯示儀表板頁面（片段：不受其他頁面元件互動影響）"""
     st.markdown('<h1 style="text-align: center; color: #1f77b4;">📊 系統儀表板</h1>', unsafe_allow_html=True)
 
-    posts = PostManager.load_posts()
+    stats = _dashboard_stats(get_post_store().revision)
 
-    if not posts:
+    if not stats["total"]:
         st.info("目前沒有任何貼文，請先創建一些貼文。")
         return
 
-    # 統計數據
-    total_posts = len(posts)
-    published_posts = [p for p in posts if p.status == "published"]
-    draft_posts = [p for p in posts if p.status == "draft"]
-    ai_posts = [p for p in posts if p.ai_generated]
-
     # 顯示統計卡片
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
-        st.metric("總貼文數", total_posts)
+        st.metric("總貼文數", stats["total"])
     with col2:
-        st.metric("已發布", len(published_posts))
+        st.metric("已發布", stats["published"])
     with col3:
-        st.metric("草稿", len(draft_posts))
+        st.metric("草稿", stats["draft"])
     with col4:
-        st.metric("AI 生成", len(ai_posts))
+        st.metric("AI 生成", stats["ai"])
 
     # 狀態分布圓餅圖
-    if posts:
-        col1, col2 = st.columns(2)
-
-        with col1:
-            st.subheader("📈 貼文狀態分布")
-            status_counts = {}
-            status_texts = {
-                "published": "已發布",
-                "draft": "草稿",
-                "scheduled": "已排程",
-                "failed": "發布失敗"
-            }
-
-            for post in posts:
-                status_text = status_texts.get(post.status, post.status)
-                status_counts[status_text] = status_counts.get(status_text, 0) + 1
-
-            fig_pie = px.pie(
-                values=list(status_counts.values()),
-                names=list(status_counts.keys()),
-                title="貼文狀態分布"
-            )
-            st.plotly_chart(fig_pie, use_container_width=True)
+    col1, col2 = st.columns(2)
 
-        with col2:
-            st.subheader("🤖 創建方式分布")
-            creation_counts = {"AI 生成": len(ai_posts), "手動創建": total_posts - len(ai_posts)}
+    with col1:
+        st.subheader("📈 貼文狀態分布")
+        fig_pie = _pie_figure(tuple(sorted(stats["status_counts"].items())), "貼文狀態分布")
+        st.plotly_chart(fig_pie, use_container_width=True)
 
-            fig_creation = px.pie(
-                values=list(creation_counts.values()),
-                names=list(creation_counts.keys()),
-                title="創建方式分布"
-            )
-            st.plotly_chart(fig_creation, use_container_width=True)
+    with col2:
+        st.subheader("🤖 創建方式分布")
+        creation_counts = (("AI 生成", stats["ai"]), ("手動創建", stats["total"] - stats["ai"]))
+        fig_creation = _pie_figure(creation_counts, "創建方式分布")
+        st.plotly_chart(fig_creation, use_container_width=True)
 
 def main():
     """主程式入口"""
@@ -582,20 +1002,19 @@ def main():
         "create_post": "➕ 創建貼文"
     }
 
+    # 頁面在導航按鈕之後才渲染，同一次執行即會顯示新頁面，不需再呼叫 st.rerun()
     for page_key, page_name in pages.items():
         if st.sidebar.button(page_name, key=f"nav_{page_key}"):
             st.session_state.page = page_key
             if 'selected_post_id' in st.session_state:
                 del st.session_state.selected_post_id
-            st.rerun()
 
     st.sidebar.divider()
 
-    # 系統信息
-    posts = PostManager.load_posts()
-    st.sidebar.metric("📊 總貼文數", len(posts))
+    # 系統信息（直接取自記憶體索引，不需 pandas 彙總）
+    st.sidebar.metric("📊 總貼文數", len(get_post_store()))
 
-    if AI_AVAILABLE:
+    if ai_available():
         st.sidebar.success("🤖 AI 功能已啟用")
     else:
         st.sidebar.warning("⚠️ AI 功能未啟用")
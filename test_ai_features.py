@@ -16,12 +16,17 @@ AI 功能測試腳本
 
 import sys
 import json
+from importlib.util import find_spec
 from pathlib import Path
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Tuple
 
-def test_imports():
+def test_imports() -> Tuple[bool, List[str]]:
     """測試必要的套件導入"""
-    print("🔍 測試套件導入...")
+    lines: List[str] = []
+    log = lines.append
+
+    log("🔍 測試套件導入...")
 
     required_packages = [
         ("streamlit", "Streamlit 前端框架"),
@@ -31,31 +36,34 @@ def test_imports():
         ("langchain", "LangChain AI 框架"),
         ("langgraph", "LangGraph 工作流程"),
         ("openai", "OpenAI API"),
-        ("requests", "HTTP 請求"),
+        ("aiohttp", "HTTP 請求"),
         ("PIL", "圖像處理")
     ]
 
     missing_packages = []
 
+    # 只檢查套件是否已安裝，不執行模組初始化；實際導入由後續的 AI 模組測試驗證
     for package, description in required_packages:
-        try:
-            __import__(package)
-            print(f"  ✅ {package} - {description}")
-        except ImportError:
-            print(f"  ❌ {package} - {description} (未安裝)")
+        if find_spec(package) is not None:
+            log(f"  ✅ {package} - {description}")
+        else:
+            log(f"  ❌ {package} - {description} (未安裝)")
             missing_packages.append(package)
 
     if missing_packages:
-        print(f"\n⚠️ 缺少以下套件：{', '.join(missing_packages)}")
-        print("請執行：pip install -r requirements.txt")
-        return False
+        log(f"\n⚠️ 缺少以下套件：{', '.join(missing_packages)}")
+        log("請執行：pip install -r requirements.txt")
+        return False, lines
     else:
-        print("✅ 所有必要套件已安裝")
-        return True
+        log("✅ 所有必要套件已安裝")
+        return True, lines
 
-def test_ai_module():
+def test_ai_module() -> Tuple[bool, List[str]]:
     """測試 AI 模組導入"""
-    print("\n🤖 測試 AI 模組...")
+    lines: List[str] = []
+    log = lines.append
+
+    log("\n🤖 測試 AI 模組...")
 
     try:
         from ai_post_generator import (
@@ -64,11 +72,11 @@ def test_ai_module():
             AIPostWorkflow,
             AIConfigManager
         )
-        print("  ✅ AI 模組導入成功")
+        log("  ✅ AI 模組導入成功")
 
         # 測試配置管理器
         config = AIConfigManager.load_config()
-        print(f"  ✅ 配置文件載入成功：{len(config)} 個設定項目")
+        log(f"  ✅ 配置文件載入成功：{len(config)} 個設定項目")
 
         # 測試請求模型
         test_request = PostGenerationRequest(
@@ -77,20 +85,23 @@ def test_ai_module():
             post_type="推廣",
             tone="友善親切"
         )
-        print("  ✅ 請求模型創建成功")
+        log("  ✅ 請求模型創建成功")
 
-        return True
+        return True, lines
 
     except ImportError as e:
-        print(f"  ❌ AI 模組導入失敗：{e}")
-        return False
+        log(f"  ❌ AI 模組導入失敗：{e}")
+        return False, lines
     except Exception as e:
-        print(f"  ❌ AI 模組測試失敗：{e}")
-        return False
+        log(f"  ❌ AI 模組測試失敗：{e}")
+        return False, lines
 
-def test_directories():
+def test_directories() -> Tuple[bool, List[str]]:
     """測試目錄結構"""
-    print("\n📁 檢查目錄結構...")
+    lines: List[str] = []
+    log = lines.append
+
+    log("\n📁 檢查目錄結構...")
 
     required_dirs = [
         ("data", "數據存儲目錄"),
@@ -101,17 +112,20 @@ def test_directories():
     for dir_path, description in required_dirs:
         path = Path(dir_path)
         if path.exists():
-            print(f"  ✅ {dir_path} - {description}")
+            log(f"  ✅ {dir_path} - {description}")
         else:
-            print(f"  ⚠️ {dir_path} - {description} (不存在，將自動創建)")
+            log(f"  ⚠️ {dir_path} - {description} (不存在，將自動創建)")
             path.mkdir(parents=True, exist_ok=True)
-            print(f"     ✅ 已創建 {dir_path}")
+            log(f"     ✅ 已創建 {dir_path}")
 
-    return True
+    return True, lines
 
-def test_configuration():
+def test_configuration() -> Tuple[bool, List[str]]:
     """測試配置文件"""
-    print("\n⚙️ 檢查 AI 配置...")
+    lines: List[str] = []
+    log = lines.append
+
+    log("\n⚙️ 檢查 AI 配置...")
 
     try:
         from ai_post_generator import AIConfigManager
@@ -122,31 +136,34 @@ def test_configuration():
         has_openai = bool(config.get("openai_api_key"))
         has_anthropic = bool(config.get("anthropic_api_key"))
 
-        print(f"  📍 OpenAI API Key: {'✅ 已設定' if has_openai else '❌ 未設定'}")
-        print(f"  📍 Anthropic API Key: {'✅ 已設定' if has_anthropic else '❌ 未設定'}")
+        log(f"  📍 OpenAI API Key: {'✅ 已設定' if has_openai else '❌ 未設定'}")
+        log(f"  📍 Anthropic API Key: {'✅ 已設定' if has_anthropic else '❌ 未設定'}")
 
         if not has_openai and not has_anthropic:
-            print("  ⚠️ 需要至少設定一個 API Key 才能使用 AI 功能")
-            print("     請在 Streamlit 應用程式的「AI 設定」標籤頁配置")
+            log("  ⚠️ 需要至少設定一個 API Key 才能使用 AI 功能")
+            log("     請在 Streamlit 應用程式的「AI 設定」標籤頁配置")
 
         # 檢查模型設定
         model = config.get("default_model", "未設定")
         temperature = config.get("temperature", 0.7)
         max_tokens = config.get("max_tokens", 1000)
 
-        print(f"  🧠 預設模型: {model}")
-        print(f"  🎨 創意度: {temperature}")
-        print(f"  📏 最大長度: {max_tokens}")
+        log(f"  🧠 預設模型: {model}")
+        log(f"  🎨 創意度: {temperature}")
+        log(f"  📏 最大長度: {max_tokens}")
 
-        return has_openai or has_anthropic
+        return has_openai or has_anthropic, lines
 
     except Exception as e:
-        print(f"  ❌ 配置檢查失敗：{e}")
-        return False
+        log(f"  ❌ 配置檢查失敗：{e}")
+        return False, lines
 
-def test_basic_workflow():
+def test_basic_workflow() -> Tuple[bool, List[str]]:
     """測試基本工作流程（不需要 API Key）"""
-    print("\n🔄 測試基本工作流程...")
+    lines: List[str] = []
+    log = lines.append
+
+    log("\n🔄 測試基本工作流程...")
 
     try:
         from ai_post_generator import PostGenerationRequest, AIPostWorkflow
@@ -162,50 +179,61 @@ def test_basic_workflow():
             max_length=200,
             generate_image=False  # 不生成圖片避免消耗 API 額度
         )
-        print("  ✅ 測試請求創建成功")
+        log("  ✅ 測試請求創建成功")
 
         # 初始化工作流程（不執行，只檢查結構）
         try:
             workflow = AIPostWorkflow()
-            print("  ✅ 工作流程初始化成功")
+            log("  ✅ 工作流程初始化成功")
         except ValueError as e:
             if "API Key" in str(e):
-                print("  ⚠️ 工作流程需要 API Key，但結構正常")
+                log("  ⚠️ 工作流程需要 API Key，但結構正常")
             else:
-                print(f"  ❌ 工作流程初始化失敗：{e}")
-                return False
+                log(f"  ❌ 工作流程初始化失敗：{e}")
+                return False, lines
         except Exception as e:
-            print(f"  ❌ 工作流程測試失敗：{e}")
-            return False
+            log(f"  ❌ 工作流程測試失敗：{e}")
+            return False, lines
 
-        return True
+        return True, lines
 
     except Exception as e:
-        print(f"  ❌ 基本工作流程測試失敗：{e}")
-        return False
+        log(f"  ❌ 基本工作流程測試失敗：{e}")
+        return False, lines
 
 def main():
     """主測試函數"""
     print("🚀 AI 自動化 Facebook 發文系統 - 功能測試")
     print("=" * 50)
 
-    tests = [
+    # 互不相依的檢查並行執行，AI 模組與基本工作流程在其後依序執行
+    parallel_tests = [
         ("套件導入", test_imports),
-        ("AI 模組", test_ai_module),
         ("目錄結構", test_directories),
-        ("配置文件", test_configuration),
+        ("配置文件", test_configuration)
+    ]
+    sequential_tests = [
+        ("AI 模組", test_ai_module),
         ("基本工作流程", test_basic_workflow)
     ]
 
-    results = []
-
-    for test_name, test_func in tests:
+    def run_test(test_name: str, test_func: Callable[[], Tuple[bool, List[str]]]) -> Tuple[bool, List[str]]:
         try:
-            result = test_func()
-            results.append((test_name, result))
+            return test_func()
         except Exception as e:
-            print(f"  ❌ {test_name} 測試過程發生錯誤：{e}")
-            results.append((test_name, False))
+            return False, [f"  ❌ {test_name} 測試過程發生錯誤：{e}"]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(run_test, test_name, test_func) for test_name, test_func in parallel_tests]
+        outcomes = [future.result() for future in futures]
+
+    outcomes += [run_test(test_name, test_func) for test_name, test_func in sequential_tests]
+
+    # 依固定順序輸出各項檢查的記錄
+    results = []
+    for (test_name, _), (result, lines) in zip(parallel_tests + sequential_tests, outcomes):
+        print("\n".join(lines))
+        results.append((test_name, result))
 
     # 總結測試結果
     print("\n" + "=" * 50)